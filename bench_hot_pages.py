@@ -0,0 +1,114 @@
+"""
+Hot-page load test: requests/sec on one published demo, with the in-memory
+page cache off (disk + sendfile, as before) and on.
+
+    python bench_hot_pages.py                          # in-process against a fixture site in a temp store
+    python bench_hot_pages.py --url http://host:5000/demos/x_AB12CD34.html
+                                                       # a running server (start it with HOT_PAGES_MB=0 for "off")
+
+Clients send Accept-Encoding: gzip like a browser does. In-process numbers are
+GIL-bound and only meaningful relative to each other.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import urllib.request
+
+SAMPLE_SECTION = """
+<section class="py-20 bg-white" data-aos="fade-up">
+  <div class="max-w-6xl mx-auto px-6 grid md:grid-cols-3 gap-8">
+    <div class="rounded-2xl shadow-lg p-8"><h3 class="text-2xl font-bold">Servicii complete</h3>
+      <p class="text-gray-600 mt-4">Lucrăm rapid, cu piese de calitate și garanție pentru fiecare intervenție.</p>
+      <img src="/img/800x600/car,repair/7" alt="Atelier" class="rounded-xl mt-6" loading="lazy"></div>
+  </div>
+</section>"""
+
+def fixture_html(sections=40):
+    """A page of roughly the size of a generated demo (~40 KB with inlined CSS)."""
+    return f"<!DOCTYPE html><html lang=\"ro\"><head><title>Service Auto Ionescu</title></head><body>{SAMPLE_SECTION * sections}</body></html>"
+
+def run_load(fetch, seconds, concurrency):
+    """Calls fetch() from `concurrency` threads for `seconds`. Returns (requests/sec, p50 ms, p95 ms)."""
+    latencies = []
+    lock = threading.Lock()
+    end = time.monotonic() + seconds
+
+    def worker():
+        local = []
+        while time.monotonic() < end:
+            started = time.perf_counter()
+            fetch()
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    if not latencies:
+        return 0, 0, 0
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+def report(label, result, baseline=None):
+    rps, p50, p95 = result
+    speedup = f"  x{rps / baseline:.1f}" if baseline else ""
+    print(f"{label:<10} {rps:8.0f} req/s   p50 {p50:6.2f} ms   p95 {p95:6.2f} ms{speedup}")
+
+def bench_in_process(seconds, concurrency):
+    os.environ.setdefault("CAMPAIGNS_DB", os.path.join(tempfile.gettempdir(), "bench_campaigns.db"))
+    import site_store
+    import hot_pages
+    from shapeshift_server import app
+
+    site_store.set_backend(site_store.LocalBackend(tempfile.mkdtemp()))
+    meta = site_store.save_site("BENCH001", fixture_html(), {"biz_name": "Service Auto Ionescu"})
+    url = f"/demos/{meta['filename']}"
+    clients = threading.local()
+
+    def fetch():
+        client = getattr(clients, "client", None) or app.test_client()
+        clients.client = client
+        response = client.get(url, headers={"Accept-Encoding": "gzip, deflate, br"})
+        assert response.status_code == 200, response.status_code
+        response.get_data()
+        response.close()
+
+    results = {}
+    for label, enabled in (("cache off", False), ("cache on", True)):
+        hot_pages.ENABLED = enabled
+        hot_pages.invalidate("BENCH001")
+        fetch()
+        results[label] = run_load(fetch, seconds, concurrency)
+        report(label, results[label], results["cache off"][0] if enabled else None)
+    print(f"hot_pages  {hot_pages.metrics()}")
+
+def bench_url(url, seconds, concurrency):
+    def fetch():
+        req = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(req, timeout=10) as response:
+            response.read()
+
+    fetch()
+    report("server", run_load(fetch, seconds, concurrency))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    if args.url:
+        bench_url(args.url, args.seconds, args.concurrency)
+    else:
+        bench_in_process(args.seconds, args.concurrency)
+
+if __name__ == "__main__":
+    sys.exit(main())
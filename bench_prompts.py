@@ -0,0 +1,81 @@
+"""
+Prompt size budget check, runnable in CI:
+
+    python bench_prompts.py            # fails (exit 1) if a prompt is over budget
+
+Builds the per-request generation and edit prompts for a representative
+business (3 reviews, extra info) and a representative 30 KB page, and checks
+them — and the static system instructions — against a size budget. Every
+request pays for the per-request part in input tokens and time to first token.
+"""
+import os
+import sys
+
+from web_generator import (
+    GENERATION_INSTRUCTIONS, EDIT_INSTRUCTIONS, DESIGN_SPEC_INSTRUCTIONS, SECTION_INSTRUCTIONS,
+    build_generation_prompt, build_edit_prompt, contact_fragment
+)
+
+# name -> budget in bytes (override with e.g. PROMPT_BUDGET_GENERATION=2000)
+BUDGETS = {
+    "generation": 1200,
+    "edit": 3000,
+    "generation_instructions": 4000,
+    "edit_instructions": 1000,
+    "design_spec_instructions": 1000,
+    "section_instructions": 1500,
+}
+
+SAMPLE_BIZ = {
+    "name": "Service Auto Ionescu", "category": "Service Auto", "address": "Str. Fabricii 12, Cluj-Napoca",
+    "phone": "0722123456", "rating": 4.8, "reviews_count": 127,
+    "reviews": [
+        {"author": "Mihai P.", "rating": 5, "text": "Am venit cu o problemă la frâne și mi-au rezolvat-o în aceeași zi. Prețuri corecte, oameni serioși."},
+        {"author": "Ana D.", "rating": 5, "text": "Foarte profesioniști, mi-au explicat tot ce au schimbat la mașină și de ce. Recomand cu încredere!"},
+        {"author": "Radu C.", "rating": 4, "text": "Revizie făcută rapid, au avut piesele pe stoc. Singurul minus e parcarea mică din fața service-ului."},
+    ],
+    "extra_info": "Program L-V 8-18, Sâmbătă 9-13. Facebook: facebook.com/serviceionescu"
+}
+
+def sample_page():
+    """A page shaped like a generated one: long body, footer with contact details at the end."""
+    section = (
+        '<section class="py-20 px-6 md:px-12" data-aos="fade-up"><div class="max-w-6xl mx-auto grid md:grid-cols-3 gap-8">'
+        + '<div class="p-6 rounded-xl shadow-lg bg-white"><h3 class="text-xl font-bold mb-2">Serviciu</h3>'
+          '<p class="text-gray-600">Diagnoză computerizată, mecanică generală și revizii complete.</p></div>' * 3
+        + '</div></section>\n'
+    )
+    footer = (
+        '<footer class="bg-gray-900 text-gray-300 py-12 px-6"><div class="max-w-6xl mx-auto grid md:grid-cols-3 gap-8">'
+        '<div><h4 class="font-bold text-white">Service Auto Ionescu</h4><p>Str. Fabricii 12, Cluj-Napoca</p></div>'
+        '<div><a href="tel:0722123456" class="hover:text-white">0722 123 456</a></div>'
+        '<div><p>Site creat de WEB? DONE! © 2026</p></div></div></footer>\n'
+    )
+    body = section * (28000 // len(section))
+    return f'<!DOCTYPE html><html lang="ro"><head><title>Service Auto Ionescu</title></head><body>\n{body}{footer}</body></html>'
+
+def measure():
+    page = sample_page()
+    start, end = contact_fragment(page)
+    return {
+        "generation": build_generation_prompt(SAMPLE_BIZ),
+        "edit": build_edit_prompt(page[start:end], "Instagram: instagram.com/serviceionescu"),
+        "generation_instructions": GENERATION_INSTRUCTIONS,
+        "edit_instructions": EDIT_INSTRUCTIONS,
+        "design_spec_instructions": DESIGN_SPEC_INSTRUCTIONS,
+        "section_instructions": SECTION_INSTRUCTIONS,
+    }
+
+def main():
+    failed = False
+    for name, prompt in measure().items():
+        budget = int(os.getenv(f"PROMPT_BUDGET_{name.upper()}", BUDGETS[name]))
+        size = len(prompt.encode("utf-8"))
+        ok = size <= budget
+        failed |= not ok
+        # ~4 bytes per token is close enough for a budget (Romanian diacritics are 2 bytes)
+        print(f"{'OK  ' if ok else 'FAIL'} {name:<24} {size:6d} B  ~{size // 4:5d} tokens (budget {budget} B)")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
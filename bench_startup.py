@@ -0,0 +1,66 @@
+"""
+Cold start budget check, runnable in CI:
+
+    python bench_startup.py            # fails (exit 1) if a module is over budget
+
+Each entry point is imported in a fresh interpreter with `-X importtime`; the
+cumulative import time must stay under its budget and the heavy SDKs must not
+be loaded before first use.
+"""
+import os
+import re
+import sys
+import subprocess
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# module -> budget in milliseconds (override with e.g. IMPORT_BUDGET_SHAPESHIFT_SERVER=500)
+BUDGETS = {
+    "shapeshift_server": 400,
+    "shapeshift_bot": 400,
+}
+
+# Must only be imported lazily, on first use
+FORBIDDEN = ["google.genai", "resend", "leads", "caller", "web_generator"]
+
+RUNS = 3
+
+def measure(module):
+    """Returns (best cumulative import time in ms, set of imported modules)."""
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCHMARK")
+    env["CAMPAIGNS_DB"] = os.path.join(tempfile.gettempdir(), "bench_campaigns.db")
+    best, imported = None, set()
+    for _ in range(RUNS):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        for line in proc.stderr.splitlines():
+            m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", line)
+            if not m:
+                continue
+            imported.add(m.group(2))
+            if m.group(2) == module:
+                ms = int(m.group(1)) / 1000
+                best = ms if best is None else min(best, ms)
+    return best, imported
+
+def main():
+    failed = False
+    for module, budget in BUDGETS.items():
+        budget = float(os.getenv(f"IMPORT_BUDGET_{module.upper()}", budget))
+        ms, imported = measure(module)
+        eager = [m for m in FORBIDDEN if m in imported]
+        ok = ms <= budget and not eager
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {module:<20} {ms:7.1f} ms (budget {budget:.0f} ms)")
+        if eager:
+            print(f"     eagerly imported: {', '.join(eager)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,106 @@
 import os
+import re
+import json
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
-
-try:
-    from google import genai
-except ImportError:
-    genai = None
+from gemini import get_client
+import usage
 
 load_dotenv()
 
+PITCH_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pitch_cache.json')
+PITCH_TIMEOUT = float(os.getenv("PITCH_TIMEOUT", "6"))
+PITCH_BATCH_SIZE = int(os.getenv("PITCH_BATCH_SIZE", "10"))
+
+# Shared pool so a slow Gemini call can keep running (and fill the cache) after we gave up waiting
+_pitch_pool = ThreadPoolExecutor(max_workers=4)
+
+def _default_pitch(biz_name):
+    return f"Salutare, te sunăm de la Web Done. Am creat un site gratuit pentru {biz_name}. Vrei să îl vezi?"
+
+class PitchCache:
+    """
+    Persistent LRU cache of sales pitches keyed by (name, category), plus one
+    reusable template per category for when Gemini is too slow to answer.
+    """
+    def __init__(self, path=PITCH_CACHE_FILE, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv("PITCH_CACHE_SIZE", "500"))
+        self.lock = threading.Lock()
+        self.pitches = OrderedDict()
+        self.templates = {}
+        self._load()
+
+    @staticmethod
+    def _key(biz_name, category):
+        norm = lambda s: re.sub(r'\s+', ' ', (s or '').strip().lower())
+        return f"{norm(biz_name)}|{norm(category)}"
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.pitches = OrderedDict(data.get("pitches", []))
+            self.templates = data.get("templates", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Pitch Cache Load Error: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"pitches": list(self.pitches.items()), "templates": self.templates}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Pitch Cache Save Error: {e}")
+
+    def get(self, biz_name, category):
+        key = self._key(biz_name, category)
+        with self.lock:
+            pitch = self.pitches.get(key)
+            if pitch is not None:
+                self.pitches.move_to_end(key)
+            return pitch
+
+    def put_many(self, items):
+        """Stores [(biz_name, category, pitch), ...] and refreshes the category templates."""
+        with self.lock:
+            for biz_name, category, pitch in items:
+                key = self._key(biz_name, category)
+                self.pitches[key] = pitch
+                self.pitches.move_to_end(key)
+                if biz_name and biz_name in pitch:
+                    self.templates[self._key('', category)] = pitch.replace(biz_name, "{biz_name}")
+            while len(self.pitches) > self.max_entries:
+                self.pitches.popitem(last=False)
+            self._save()
+
+    def put(self, biz_name, category, pitch):
+        self.put_many([(biz_name, category, pitch)])
+
+    def fallback(self, biz_name, category):
+        """Category template if we have one, otherwise the generic pitch."""
+        template = self.templates.get(self._key('', category))
+        if template:
+            return template.replace("{biz_name}", biz_name)
+        return _default_pitch(biz_name)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def shared_pitch_cache():
+    """The process-wide PitchCache: every ColdCaller (concurrent campaigns) writes through the same one."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = PitchCache()
+        return _shared_cache
+
 class ColdCaller:
     """
     Handles automated sales calls in Romanian using Retell AI + Gemini.
@@ -20,38 +112,104 @@ class ColdCaller:
         self.agent_id = os.getenv("RETELL_AGENT_ID")
         self.view_url_base = os.getenv("VIEW_URL", "http://localhost:5000/view")
         
-        # Initialize Gemini for pre-call strategic planning
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if gemini_api_key and genai:
-            self.gemini_client = genai.Client(api_key=gemini_api_key)
-        else:
-            self.gemini_client = None
+        # Gemini for pre-call strategic planning
+        self.gemini_client = get_client()
+
+        self.pitch_cache = shared_pitch_cache()
+
+    PITCH_RULES = """
+        Context: Deja am construit un site web Premium, gratis, demonstrativ, special pentru ei.
+        Nu folosi limbaj de lemn sau robotic. Fii amical, românesc (folosește 'tu' sau 'dumneavoastră' în funcție de domeniu, ex: 'tu' la curățenie/construcții, 'dumneavoastră' la clinică medicală).
+
+        Exemplu bun: "Salutare! Am observat afacerea ta și mi-a plăcut mult ce faceți. Fiindcă la Web Done testăm niște designuri noi, echipa mea ți-a construit deja un site complet, gratuit, să vezi cum arată."
+        Exemplu bun 2: "Bună ziua, vă deranjez un minut. Am văzut {biz_name} online și am decis să vă fac o surpriză: v-am creat un site web modern, luxos, cu imagini gata puse, ca o demonstrație."
+        """
+
+    def _ask_gemini(self, prompt, tags=None, **config):
+        response = self.gemini_client.models.generate_content(
+            model='gemini-2.5-flash',
+            contents=prompt,
+            config=config or None
+        )
+        usage.record_gemini('gemini-2.5-flash', response, tags)
+        return response.text.strip()
 
     def _generate_smart_pitch(self, biz_name, category):
-        """Uses Gemini to craft a hyper-personalized hook for the AI Caller."""
+        """Uses Gemini to craft a hyper-personalized hook for the AI Caller (cached per business)."""
+        cached = self.pitch_cache.get(biz_name, category)
+        if cached:
+            return cached
+
         if not self.gemini_client:
-            return f"Salutare, te sunăm de la Web Done. Am creat un site gratuit pentru {biz_name}. Vrei să îl vezi?"
+            return self.pitch_cache.fallback(biz_name, category)
             
         prompt = f"""
         Ești un expert în vânzări B2B (Cold Calling).
         Generează 'Gheața' (The Hook) de 2 propoziții scurte pentru un apel telefonic către afacerea: '{biz_name}' din domeniul '{category}'.
-        
-        Context: Deja am construit un site web Premium, gratis, demonstrativ, special pentru ei.
-        Nu folosi limbaj de lemn sau robotic. Fii amical, românesc (folosește 'tu' sau 'dumneavoastră' în funcție de domeniu, ex: 'tu' la curățenie/construcții, 'dumneavoastră' la clinică medicală).
-        
-        Exemplu bun: "Salutare! Am observat afacerea ta și mi-a plăcut mult ce faceți. Fiindcă la Web Done testăm niște designuri noi, echipa mea ți-a construit deja un site complet, gratuit, să vezi cum arată."
-        Exemplu bun 2: "Bună ziua, vă deranjez un minut. Am văzut {biz_name} online și am decis să vă fac o surpriză: v-am creat un site web modern, luxos, cu imagini gata puse, ca o demonstrație."
-        
+        {self.PITCH_RULES.replace('{biz_name}', biz_name)}
         Returnează DOAR pitch-ul, fără ghilimele, fără alte explicații.
         """
+
+        def _store(future):
+            if not future.exception() and future.result():
+                self.pitch_cache.put(biz_name, category, future.result())
+
+        future = _pitch_pool.submit(self._ask_gemini, prompt, usage.current_tags())
+        # Even if we stop waiting, a late answer still lands in the cache for the next retry
+        future.add_done_callback(_store)
         try:
-            response = self.gemini_client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=prompt
-            )
-            return response.text.strip()
-        except:
-            return f"Salutare, te sunăm de la Web Done. Am creat un site gratuit pentru {biz_name}. Vrei să îl vezi?"
+            return future.result(timeout=PITCH_TIMEOUT) or self.pitch_cache.fallback(biz_name, category)
+        except FutureTimeout:
+            print(f"⏱️ [PITCH] Gemini too slow for {biz_name}, using {category} template.")
+            return self.pitch_cache.fallback(biz_name, category)
+        except Exception:
+            return self.pitch_cache.fallback(biz_name, category)
+
+    def generate_pitches(self, leads):
+        """
+        Pre-computes pitches for a list of leads ({'name', 'category'}) with one Gemini
+        call per batch and returns {name: pitch}. Cached leads never hit the model.
+        """
+        pitches = {}
+        missing = []
+        for lead in leads:
+            cached = self.pitch_cache.get(lead['name'], lead.get('category'))
+            if cached:
+                pitches[lead['name']] = cached
+            else:
+                missing.append(lead)
+
+        if missing and self.gemini_client:
+            for i in range(0, len(missing), PITCH_BATCH_SIZE):
+                batch = missing[i:i + PITCH_BATCH_SIZE]
+                listing = "\n".join(f'{n + 1}. "{l["name"]}" — {l.get("category") or "Afacere"}' for n, l in enumerate(batch))
+                prompt = f"""
+        Ești un expert în vânzări B2B (Cold Calling).
+        Pentru FIECARE afacere de mai jos generează 'Gheața' (The Hook) de 2 propoziții scurte pentru un apel telefonic.
+        {self.PITCH_RULES.replace('{biz_name}', 'Numele Afacerii')}
+        AFACERI:
+        {listing}
+
+        Returnează DOAR un JSON array: [{{"index": 1, "pitch": "..."}}, ...], câte un obiect pentru fiecare afacere.
+        """
+                try:
+                    future = _pitch_pool.submit(self._ask_gemini, prompt, usage.current_tags(), response_mime_type="application/json")
+                    items = json.loads(future.result(timeout=PITCH_TIMEOUT * 3))
+                    fresh = []
+                    for item in items:
+                        idx = int(item.get("index", 0)) - 1
+                        pitch = (item.get("pitch") or "").strip()
+                        if 0 <= idx < len(batch) and pitch:
+                            fresh.append((batch[idx]['name'], batch[idx].get('category'), pitch))
+                            pitches[batch[idx]['name']] = pitch
+                    self.pitch_cache.put_many(fresh)
+                except Exception as e:
+                    print(f"⚠️ [PITCH] Batch generation failed ({len(batch)} leads): {e}")
+
+        for lead in leads:
+            if lead['name'] not in pitches:
+                pitches[lead['name']] = self.pitch_cache.fallback(lead['name'], lead.get('category'))
+        return pitches
 
     def place_call(self, biz_name, phone, site_id, category="Afacere"):
         """Initiates a custom-crafted call to the business."""
@@ -100,6 +258,7 @@ class ColdCaller:
             if response.status_code == 201:
                 result = response.json()
                 print(f"✅ [SUCCESS] Call active! ID: {result.get('call_id')}")
+                usage.record_retell_call(result.get('call_id'))
                 print(f"🔗 [INFO] They will be directed to: {demo_link}")
                 return result
             else:
@@ -0,0 +1,179 @@
+"""
+Persistent outreach campaigns — every lead is tracked through
+found → site_generated → calling → called, so a redeploy never repeats
+Gemini or Retell spend for a business we already processed.
+"""
+import os
+import re
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMPAIGNS_DB = os.getenv("CAMPAIGNS_DB", os.path.join(BASE_DIR, 'campaigns.db'))
+
+# Lead states, in order
+FOUND = 'found'
+SITE_GENERATED = 'site_generated'
+CALLING = 'calling'
+CALLED = 'called'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER,
+    niche TEXT NOT NULL,
+    location TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'searching',
+    created TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns(id),
+    place_id TEXT UNIQUE,
+    phone_norm TEXT UNIQUE,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'found',
+    site_id TEXT,
+    filename TEXT,
+    call_id TEXT,
+    outcome TEXT,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leads_campaign ON leads(campaign_id);
+"""
+
+def normalize_phone(phone):
+    """
+    E.164: '0722 123 456', '+40 722-123-456' and '0040722123456' all become '+40722123456'.
+    Foreign numbers ('+36 1 234 5678', '0036...') keep their own country code.
+    """
+    raw = (phone or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    if not digits:
+        return None
+    if raw.startswith('+') or digits.startswith('00'):
+        if not raw.startswith('+'):
+            digits = digits[2:]
+        if not digits.startswith('40'):
+            return '+' + digits
+        digits = digits[2:]
+    elif digits.startswith('40') and len(digits) == 11:
+        digits = digits[2:]
+    # National (or +40) number: drop the trunk 0
+    return '+40' + digits.lstrip('0')
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+class CampaignStore:
+    """SQLite-backed campaign and lead records, safe to use from several threads."""
+    def __init__(self, path=CAMPAIGNS_DB):
+        self.path = path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    def create_campaign(self, chat_id, niche, location):
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO campaigns (chat_id, niche, location, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, niche, location, _now(), _now())
+            )
+            return cur.lastrowid
+
+    def get_campaign(self, campaign_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+            return dict(row) if row else None
+
+    def set_status(self, campaign_id, status):
+        with self._connect() as db:
+            db.execute("UPDATE campaigns SET status = ?, updated = ? WHERE id = ?", (status, _now(), campaign_id))
+
+    def unfinished_campaigns(self):
+        """Campaigns interrupted by a crash or redeploy."""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM campaigns WHERE status IN ('searching', 'running') ORDER BY id").fetchall()
+            return [dict(r) for r in rows]
+
+    def queued_campaigns(self):
+        """Campaigns paused until the daily API budget allows them to continue."""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM campaigns WHERE status = 'queued' ORDER BY id").fetchall()
+            return [dict(r) for r in rows]
+
+    def is_known(self, biz):
+        """True if a business (raw SerpApi result or lead) was already taken by any campaign."""
+        place_id = biz.get("place_id") or None
+        phone_norm = normalize_phone(biz.get("phone"))
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT 1 FROM leads WHERE place_id = ? OR phone_norm = ?", (place_id, phone_norm)
+            ).fetchone()
+            return row is not None
+
+    def add_leads(self, campaign_id, leads):
+        """Stores new leads for the campaign, silently dropping duplicates. Returns how many were added."""
+        added = 0
+        with self._connect() as db:
+            for lead in leads:
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO leads (campaign_id, place_id, phone_norm, name, data, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (campaign_id, lead.get("place_id") or None, normalize_phone(lead.get("phone")),
+                     lead["name"], json.dumps(lead, ensure_ascii=False), _now())
+                )
+                added += cur.rowcount
+        return added
+
+    def leads(self, campaign_id):
+        """All leads of a campaign as dicts: the original lead data plus 'lead_id', 'state', 'site_id', ..."""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM leads WHERE campaign_id = ? ORDER BY id", (campaign_id,)).fetchall()
+        result = []
+        for row in rows:
+            lead = json.loads(row["data"])
+            lead.update({
+                "lead_id": row["id"], "state": row["state"], "site_id": row["site_id"],
+                "filename": row["filename"], "call_id": row["call_id"], "outcome": row["outcome"]
+            })
+            result.append(lead)
+        return result
+
+    def _update_lead(self, lead_id, **fields):
+        fields["updated"] = _now()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE leads SET {assignments} WHERE id = ?", (*fields.values(), lead_id))
+
+    def mark_site_generated(self, lead_id, site_id, filename):
+        self._update_lead(lead_id, state=SITE_GENERATED, site_id=site_id, filename=filename)
+
+    def mark_calling(self, lead_id):
+        self._update_lead(lead_id, state=CALLING)
+
+    def mark_called(self, lead_id, outcome, call_id=None):
+        self._update_lead(lead_id, state=CALLED, outcome=outcome, call_id=call_id)
+
+    def summary(self, limit=10):
+        """Latest campaigns with their per-state lead counts."""
+        with self._connect() as db:
+            campaigns = [dict(r) for r in db.execute("SELECT * FROM campaigns ORDER BY id DESC LIMIT ?", (limit,))]
+            for c in campaigns:
+                counts = db.execute(
+                    "SELECT state, COUNT(*) AS n FROM leads WHERE campaign_id = ? GROUP BY state", (c["id"],)
+                ).fetchall()
+                c["counts"] = {r["state"]: r["n"] for r in counts}
+        return campaigns
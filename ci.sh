@@ -0,0 +1,22 @@
+#!/bin/bash
+# Regression checks for CI — exits non-zero on the first failure:
+#
+#     bash ci.sh
+#
+# Runs without network or API keys: import-time and prompt-size budgets, the
+# S3 storage backend against an in-memory bucket, and a Telegram webhook round
+# trip against the fake Bot API.
+set -e
+cd "$(dirname "$0")"
+
+TMP=$(mktemp -d)
+trap 'rm -rf "$TMP"' EXIT
+export CAMPAIGNS_DB="$TMP/campaigns.db" USAGE_DB="$TMP/usage.db" SEARCH_DB="$TMP/search.db"
+
+python3 -m compileall -q .
+python3 bench_startup.py
+python3 bench_prompts.py
+python3 fake_s3.py
+BOT_MODE=webhook TELEGRAM_BOT_TOKEN=1:fake TELEGRAM_WEBHOOK_SECRET=ci GEMINI_API_KEY= \
+    python3 fake_telegram.py "/start"
+echo "✅ CI checks passed"
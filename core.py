@@ -1,20 +1,30 @@
 import os
 import json
-import re
 import uuid
 import random
-import requests
-import resend
 from datetime import datetime
-from web_generator import WebGenerator
+import site_pool
+import site_store
+import image_proxy
+import css_build
+import site_preview
+import search_index
+import usage
+import profiler
+import hot_pages
+
+# requests, resend and the Gemini-backed WebGenerator are imported inside the
+# functions that need them, so importing core stays cheap for the server and bot.
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SITES_DIR = os.path.join(BASE_DIR, 'demos')
+SITES_DIR = site_store.SITES_DIR
+# Legacy flat mirror of demos/ — `python site_store.py migrate` folds it into the sharded layout
 GEN_DIR = os.path.join(BASE_DIR, 'generated_sites')
-STATS_FILE = os.path.join(BASE_DIR, 'stats.json')
+# Legacy location — counters now live in the site store (shared by every node)
+STATS_FILE = site_store.LEGACY_STATS_FILE
+STATS_DEFAULTS = {"sites_created": 149}
 
 os.makedirs(SITES_DIR, exist_ok=True)
-os.makedirs(GEN_DIR, exist_ok=True)
 
 # Temporary in-memory storage for verification codes
 verification_codes = {}
@@ -32,6 +42,7 @@ def send_verification_code(email):
     
     if resend_key:
         try:
+            import resend
             resend.api_key = resend_key
             resend.Emails.send({
                 "from": "ShapeShift AI <onboarding@resend.dev>",
@@ -58,6 +69,7 @@ def send_verification_code(email):
     bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
     if admin_id and bot_token:
         try:
+            import requests
             msg = f"🔑 **COD VERIFICARE NOU**\n\n📧 Email: `{email}`\n🔢 Cod: `{code}`\n\n{'✅ Trimis pe email' if sent_via_email else '⚠️ Eroare Email - Trimite-l manual!'}"
             api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
             requests.post(api_url, json={"chat_id": admin_id, "text": msg, "parse_mode": "Markdown"})
@@ -94,6 +106,7 @@ def notify_admin_site_created(biz_name, site_id, url, chat_id=None):
         msg += f"\n🌐 Creat via: `Website`"
 
     try:
+        import requests
         api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
         requests.post(api_url, json={
             "chat_id": admin_id,
@@ -105,60 +118,79 @@ def notify_admin_site_created(biz_name, site_id, url, chat_id=None):
 
 def increment_counter():
     try:
-        if os.path.exists(STATS_FILE):
-            with open(STATS_FILE, 'r') as f:
-                stats = json.load(f)
-        else:
-            stats = {"sites_created": 149}
-        
-        stats["sites_created"] += 1
-        
-        with open(STATS_FILE, 'w') as f:
-            json.dump(stats, f)
-        return stats["sites_created"]
+        site_store.increment_stat("sites_created")
+        return site_store.load_stats(STATS_DEFAULTS)["sites_created"]
     except Exception as e:
         print(f"Counter Error: {e}")
         return None
 
-def generate_and_save(biz_data):
-    generator = WebGenerator()
-    html = generator._generate_ai_html(biz_data)
-    
+def _index(meta, html):
+    """Keeps the search index in step with the store; a search hiccup never fails a generation."""
+    try:
+        search_index.index_site(meta, html)
+    except Exception as e:
+        print(f"Search Index Error: {e}")
+
+def generate_and_save(biz_data, deadline=None):
+    """Generates and stores a site. Returns (site_id, filename, html) — the HTML straight from memory."""
     site_id = str(uuid.uuid4())[:8].upper()
-    clean_biz = re.sub(r'[^a-zA-Z0-9]', '_', biz_data['name']).lower()
-    filename = f"{clean_biz}_{site_id}.html"
-    
-    # Save to both folders for consistency
-    for d in [SITES_DIR, GEN_DIR]:
-        with open(os.path.join(d, filename), 'w', encoding='utf-8') as f:
-            f.write(html)
+    # Popular niches are served instantly from the pre-generated pool
+    with profiler.phase("pool"):
+        html = site_pool.take(biz_data)
+    if html is None:
+        from web_generator import WebGenerator
+        generator = WebGenerator()
+        with usage.tag(site_id=site_id), profiler.phase("generate"):
+            html = generator._generate_ai_html(biz_data, deadline=deadline)
+
+    # Static inlined CSS instead of compiling Tailwind in the visitor's browser (no-op for prebuilt pool pages)
+    with profiler.phase("css"):
+        html = css_build.inline_css(html)
+    # Serve images from our own cache and start fetching them before the prospect opens the page
+    html = image_proxy.rewrite_html(html)
+    image_proxy.prefetch(html)
+
+    with profiler.phase("save"):
+        meta = site_store.save_site(site_id, html, {
+            "biz_name": biz_data["name"],
+            "category": biz_data.get("category"),
+            "address": biz_data.get("address"),
+            "phone": biz_data.get("phone"),
+            "extra_info": biz_data.get("extra_info")
+        })
+    # Prospects open a fresh demo right after the call — have it hot before the first hit
+    hot_pages.put(site_id, html, meta["revision"])
+    with profiler.phase("preview+index"):
+        site_preview.refresh(site_id, html)
+        _index(meta, html)
             
     increment_counter()
-    return site_id, filename
+    return site_id, meta["filename"], html
 
-def update_site_links(site_id, extra_info):
+def update_site_links(site_id, extra_info, deadline=None):
     """Finds a site by ID and updates its content with new links/info."""
-    # Find the file
-    filename = None
-    files = os.listdir(SITES_DIR)
-    for f in files:
-        if site_id in f and f.endswith('.html'):
-            filename = f
-            break
-    
-    if not filename:
+    site_id = site_store.resolve(site_id)
+    old_html = site_store.load_html(site_id) if site_id else None
+    if old_html is None:
         return False, "Site-ul nu a fost găsit."
 
-    path = os.path.join(SITES_DIR, filename)
-    with open(path, 'r', encoding='utf-8') as f:
-        old_html = f.read()
-
+    from web_generator import WebGenerator
     generator = WebGenerator()
-    new_html = generator.enrich_html_with_links(old_html, extra_info)
-
-    # Save back to both
-    for d in [SITES_DIR, GEN_DIR]:
-        with open(os.path.join(d, filename), 'w', encoding='utf-8') as f:
-            f.write(new_html)
-    
-    return True, filename
+    with usage.tag(site_id=site_id), profiler.phase("edit"):
+        new_html = generator.enrich_html_with_links(old_html, extra_info, deadline=deadline)
+    with profiler.phase("css"):
+        new_html = image_proxy.rewrite_html(css_build.inline_css(new_html))
+    image_proxy.prefetch(new_html)
+
+    if not site_store.html_path(site_id):
+        # Edited after the janitor archived it: bring it back as a live site
+        revision = site_store.save_site(site_id, new_html, site_store.load_meta(site_id))["revision"]
+    else:
+        revision = site_store.save_html(site_id, new_html)
+    hot_pages.put(site_id, new_html, revision)
+    # The owner engaged with the demo — keep it out of the janitor's reach
+    old_info = site_store.load_meta(site_id).get("extra_info")
+    meta = site_store.update_meta(site_id, claimed=True, extra_info="\n".join(filter(None, [old_info, extra_info])))
+    site_preview.refresh(site_id, new_html)
+    _index(meta, new_html)
+    return True, meta["filename"]
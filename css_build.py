@@ -0,0 +1,214 @@
+"""
+Post-generation CSS build: replaces the Tailwind Play CDN (which compiles CSS in
+the visitor's browser) with a static, minified stylesheet containing only the
+classes the page uses, inlined in <head>. The colors and fonts of the page's own
+tailwind.config are honored; the rest of it is model output and never reaches
+the build (it is parsed as data, not run).
+
+Uses the Tailwind standalone CLI (v3) from TAILWIND_BIN or $PATH, provisioned
+with the deployment image; without it pages are left on the CDN.
+
+    python css_build.py report [files or dirs]    # page weight / load time before and after
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import subprocess
+import tempfile
+
+# The build runs inside the generation request — a stuck CLI must not eat the request's deadline
+BUILD_TIMEOUT = float(os.getenv("CSS_BUILD_TIMEOUT", "10"))
+
+CDN_SCRIPT_RE = re.compile(r'<script[^>]+src="https://cdn\.tailwindcss\.com[^"]*"[^>]*>\s*</script>\s*', re.IGNORECASE)
+CONFIG_SCRIPT_RE = re.compile(r'<script>(?:(?!</script>).)*?tailwind\.config\s*=\s*(\{.*?\})\s*;?\s*</script>\s*', re.IGNORECASE | re.DOTALL)
+TW_STYLE_RE = re.compile(r'<style[^>]*type="text/tailwindcss"[^>]*>(.*?)</style>\s*', re.IGNORECASE | re.DOTALL)
+
+THEME_KEY_RE = re.compile(r'^[\w-]+$')
+THEME_VALUE_RE = re.compile(r'^[\w#(),.%/\s\'"-]+$')
+
+_warned_missing = False
+
+def find_tailwind():
+    return os.getenv("TAILWIND_BIN") or shutil.which("tailwindcss")
+
+JS_TOKEN_RE = re.compile(
+    r'"(?:[^"\\]|\\.)*"'      # double-quoted string: already JSON
+    r"|'((?:[^'\\]|\\.)*)'"   # single-quoted string
+    r'|/\*.*?\*/'             # comment
+    r'|([\w$-]+)(\s*:)'       # bare key
+    r'|,(\s*[}\]])',          # trailing comma
+    re.DOTALL
+)
+
+def _js_to_json(literal):
+    """The small JS object literals pages use ({a:'x',b:["y"],}) -> JSON text."""
+    def convert(m):
+        if m.group(1) is not None:
+            return json.dumps(m.group(1).replace("\\'", "'"))
+        if m.group(2) is not None:
+            return f'"{m.group(2)}"{m.group(3)}'
+        if m.group(4) is not None:
+            return m.group(4)
+        return "" if m.group(0).startswith("/*") else m.group(0)
+    return JS_TOKEN_RE.sub(convert, literal)
+
+def _clean_theme_map(value, nested):
+    """Keeps only name -> CSS value entries (one level of nesting for color shades / font stacks)."""
+    if not isinstance(value, dict):
+        return {}
+    clean = {}
+    for key, item in value.items():
+        if not THEME_KEY_RE.match(str(key)):
+            continue
+        if isinstance(item, str) and THEME_VALUE_RE.match(item):
+            clean[key] = item
+        elif nested == "list" and isinstance(item, list):
+            clean[key] = [f for f in item if isinstance(f, str) and THEME_VALUE_RE.match(f)]
+        elif nested == "dict" and isinstance(item, dict):
+            clean[key] = {k: v for k, v in item.items()
+                          if THEME_KEY_RE.match(str(k)) and isinstance(v, str) and THEME_VALUE_RE.match(v)}
+    return clean
+
+def parse_config(literal):
+    """theme.extend colors + fontFamily of a page's tailwind.config literal, or None if it can't be parsed as data."""
+    try:
+        config = json.loads(_js_to_json(literal))
+    except ValueError:
+        return None
+    extend = ((config.get("theme") or {}).get("extend") or {}) if isinstance(config, dict) else {}
+    if not isinstance(extend, dict):
+        return None
+    return {
+        "colors": _clean_theme_map(extend.get("colors"), "dict"),
+        "fontFamily": _clean_theme_map(extend.get("fontFamily"), "list")
+    }
+
+def compile_css(html, theme_extend=None, extra_css="", plugins=()):
+    """Runs the Tailwind CLI over the page and returns the minified CSS, or None if unavailable/failed."""
+    global _warned_missing
+    tailwind = find_tailwind()
+    if not tailwind:
+        if not _warned_missing:
+            print("⚠️ [CSS] Tailwind CLI not found (TAILWIND_BIN / tailwindcss on PATH) — pages stay on the CDN", flush=True)
+            _warned_missing = True
+        return None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "page.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        with open(os.path.join(tmp, "input.css"), "w", encoding="utf-8") as f:
+            f.write(f"@tailwind base;\n@tailwind components;\n@tailwind utilities;\n{extra_css}")
+        with open(os.path.join(tmp, "tailwind.config.js"), "w", encoding="utf-8") as f:
+            # Only sanitized data is written, as JSON — nothing the model wrote is executed by Node
+            theme = json.dumps({"extend": theme_extend or {}})
+            requires = ", ".join(f"require('@tailwindcss/{p}')" for p in plugins if re.match(r'^[a-z-]+$', p))
+            f.write(f"module.exports = {{theme: {theme}, content: ['./page.html'], plugins: [{requires}]}};\n")
+        try:
+            subprocess.run(
+                [tailwind, "-c", "tailwind.config.js", "-i", "input.css", "-o", "out.css", "--minify"],
+                cwd=tmp, capture_output=True, timeout=BUILD_TIMEOUT, check=True
+            )
+            with open(os.path.join(tmp, "out.css"), "r", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"[CSS] Tailwind build failed: {e}", flush=True)
+            return None
+
+def inline_css(html):
+    """Swaps the Tailwind CDN runtime for the page's compiled CSS. Returns the page unchanged if it can't."""
+    cdn = CDN_SCRIPT_RE.search(html)
+    if not cdn:
+        return html
+
+    config = CONFIG_SCRIPT_RE.search(html)
+    theme_extend = parse_config(config.group(1)) if config else {}
+    if theme_extend is None:
+        # Building without the page's colors/fonts would break its look — leave it on the CDN
+        print("[CSS] Unparsable tailwind.config, keeping the CDN", flush=True)
+        return html
+    extra_css = "\n".join(TW_STYLE_RE.findall(html))
+    # cdn.tailwindcss.com?plugins=forms,typography -> the same first-party plugins (bundled in the standalone CLI)
+    plugins = re.search(r'plugins=([\w,\-]+)', cdn.group(0))
+    plugins = [p for p in plugins.group(1).split(',') if p] if plugins else []
+    css = compile_css(html, theme_extend, extra_css, plugins)
+    if css is None:
+        return html
+
+    html = TW_STYLE_RE.sub("", html)
+    if config:
+        html = html.replace(config.group(0), "", 1)
+    return CDN_SCRIPT_RE.sub(lambda _: f"<style>{css}</style>\n", html, count=1)
+
+# --- Report ------------------------------------------------------------------
+
+def _cdn_runtime_bytes():
+    try:
+        import requests
+        return len(requests.get("https://cdn.tailwindcss.com", timeout=10).content)
+    except Exception:
+        return None
+
+def _load_time_ms(html):
+    """Navigation start -> load event in headless Chromium, if Playwright is installed."""
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        return None
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as f:
+        f.write(html)
+    try:
+        with sync_playwright() as p:
+            browser = p.chromium.launch()
+            page = browser.new_page()
+            page.goto(f"file://{f.name}", wait_until="load")
+            ms = page.evaluate("performance.getEntriesByType('navigation')[0].loadEventEnd")
+            browser.close()
+            return ms
+    finally:
+        os.remove(f.name)
+
+def _corpus(args):
+    if not args:
+        import site_store
+        return [p for p in (site_store.html_path(i) for i in site_store.iter_site_ids()) if p]
+    files = []
+    for arg in args:
+        if os.path.isdir(arg):
+            files += [os.path.join(root, n) for root, _, names in os.walk(arg) for n in names if n.endswith(".html")]
+        else:
+            files.append(arg)
+    return files
+
+def report(args):
+    if not find_tailwind():
+        print("Tailwind CLI not found (set TAILWIND_BIN) — nothing to compare.")
+        return
+    runtime = _cdn_runtime_bytes()
+    print(f"{'page':<40} {'before KB':>10} {'after KB':>9} {'build ms':>9} {'load ms':>15}")
+    totals = [0, 0]
+    for path in _corpus(args):
+        with open(path, "r", encoding="utf-8") as f:
+            before = f.read()
+        started = time.monotonic()
+        after = inline_css(before)
+        build_ms = (time.monotonic() - started) * 1000
+        # Before: the page plus the CDN runtime every visitor downloads and executes
+        before_kb = (len(before.encode()) + (runtime or 0)) / 1024
+        after_kb = len(after.encode()) / 1024
+        totals[0] += before_kb
+        totals[1] += after_kb
+        load_before, load_after = _load_time_ms(before), _load_time_ms(after)
+        load = f"{load_before:.0f} -> {load_after:.0f}" if load_before is not None else "n/a"
+        print(f"{os.path.basename(path)[:40]:<40} {before_kb:>10.1f} {after_kb:>9.1f} {build_ms:>9.0f} {load:>15}")
+    print(f"{'TOTAL':<40} {totals[0]:>10.1f} {totals[1]:>9.1f}")
+    if runtime is None:
+        print("(CDN runtime size unavailable offline — 'before' counts the HTML only)")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "report":
+        report(sys.argv[2:])
+    else:
+        print(__doc__)
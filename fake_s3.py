@@ -0,0 +1,116 @@
+"""
+In-memory stand-in for an S3-compatible object store, for running the S3
+storage backend without boto3 or a bucket.
+
+    python fake_s3.py      # two "nodes" sharing one fake bucket: write on A, read/edit/archive across both
+                           # (exits 1 if a node sees the wrong content — run by ci.sh)
+
+FakeS3Client implements the few client calls S3Backend uses (get/put/head/
+delete_object, list_objects_v2 paginator) with S3's error shape.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+class FakeClientError(Exception):
+    def __init__(self, code, operation):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation")
+        self.response = {"Error": {"Code": code}}
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+class _Paginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix="", PageSize=1000):
+        keys = sorted(k for b, k in self.client._objects(Bucket) if k.startswith(Prefix))
+        for i in range(0, max(len(keys), 1), PageSize):
+            yield {"Contents": [{"Key": k} for k in keys[i:i + PageSize]]}
+
+class FakeS3Client:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.calls = {}
+
+    def _count(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def _objects(self, bucket):
+        with self.lock:
+            return [key for key in self.objects if key[0] == bucket]
+
+    def put_object(self, Bucket, Key, Body):
+        self._count("PutObject")
+        data = Body if isinstance(Body, bytes) else Body.encode('utf-8')
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self.lock:
+            self.objects[(Bucket, Key)] = (data, etag)
+        return {"ETag": etag}
+
+    def _get(self, Bucket, Key, operation):
+        self._count(operation)
+        with self.lock:
+            found = self.objects.get((Bucket, Key))
+        if found is None:
+            raise FakeClientError("NoSuchKey" if operation == "GetObject" else "404", operation)
+        return found
+
+    def get_object(self, Bucket, Key):
+        data, etag = self._get(Bucket, Key, "GetObject")
+        return {"Body": _Body(data), "ETag": etag}
+
+    def head_object(self, Bucket, Key):
+        data, etag = self._get(Bucket, Key, "HeadObject")
+        return {"ETag": etag, "ContentLength": len(data)}
+
+    def delete_object(self, Bucket, Key):
+        self._count("DeleteObject")
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        self._count("ListObjectsV2")
+        return _Paginator(self)
+
+if __name__ == "__main__":
+    import site_store
+
+    client = FakeS3Client()
+    tmp = tempfile.mkdtemp()
+    node_a = site_store.CachedBackend(site_store.S3Backend("sites", "demos", client=client), os.path.join(tmp, "a"), ttl=0)
+    node_b = site_store.CachedBackend(site_store.S3Backend("sites", "demos", client=client), os.path.join(tmp, "b"), ttl=0)
+
+    site_store.set_backend(node_a)
+    meta = site_store.save_site("FAKE0001", "<html>v1</html>", {"biz_name": "Fake SRL"})
+    print("A saved       ", meta["filename"])
+
+    site_store.set_backend(node_b)
+    seen = open(site_store.html_path("FAKE0001")).read()
+    print("B resolves    ", site_store.resolve(meta["filename"]), "->", seen)
+    assert site_store.resolve(meta["filename"]) == "FAKE0001" and seen == "<html>v1</html>"
+
+    site_store.set_backend(node_a)
+    site_store.save_html("FAKE0001", "<html>v2</html>")
+    site_store.set_backend(node_b)
+    seen = open(site_store.html_path("FAKE0001")).read()
+    print("B after edit  ", seen)
+    assert seen == "<html>v2</html>"
+
+    site_store.archive_site("FAKE0001")
+    site_store.set_backend(node_a)
+    print("A archived    ", site_store.html_path("FAKE0001"), site_store.load_html("FAKE0001"))
+    assert site_store.html_path("FAKE0001") is None and site_store.load_html("FAKE0001") == "<html>v2</html>"
+    print("stats         ", json.dumps(node_a.stats()))
+    print("S3 calls      ", json.dumps(client.calls))
@@ -0,0 +1,92 @@
+"""
+In-memory stand-in for the Telegram Bot API, for running the bot without a
+network or a real token.
+
+install() routes every pyTelegramBotAPI request through a local sender
+(apihelper.CUSTOM_REQUEST_SENDER) that records the call and answers like
+Telegram would. Messages can then be fed through the server's webhook route:
+
+    BOT_MODE=webhook TELEGRAM_BOT_TOKEN=1:fake TELEGRAM_WEBHOOK_SECRET=s3cret \\
+        python fake_telegram.py "/start" "Pizzeria Roma" "Restaurant"
+
+Exits 1 if the webhook rejects an update or the bot doesn't answer (run by ci.sh).
+"""
+import sys
+import json
+import time
+import itertools
+import threading
+
+SENT = []
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+class FakeResponse:
+    def __init__(self, result):
+        self.status_code = 200
+        self.text = json.dumps({"ok": True, "result": result})
+
+    def json(self):
+        return json.loads(self.text)
+
+def _sender(method, url, params=None, files=None, **kwargs):
+    api_method = url.rsplit('/', 1)[-1]
+    params = dict(params or {})
+    with _lock:
+        SENT.append({"method": api_method, "params": params})
+    if api_method.startswith("send"):
+        # Enough of a Message for the library to parse it
+        result = {
+            "message_id": next(_ids), "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"}, "text": params.get("text")
+        }
+    elif api_method == "getMe":
+        result = {"id": 1, "is_bot": True, "first_name": "WebDone", "username": "webdone_bot"}
+    else:
+        result = True
+    return FakeResponse(result)
+
+def install():
+    from telebot import apihelper
+    apihelper.CUSTOM_REQUEST_SENDER = _sender
+
+def update(text, chat_id=1000, user_id=None):
+    """A Telegram Update (as JSON text) for a private text message."""
+    message = {
+        "message_id": next(_ids), "date": int(time.time()), "text": text,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": user_id or chat_id, "is_bot": False, "first_name": "Test"},
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return json.dumps({"update_id": next(_ids), "message": message})
+
+def replies(wait=5):
+    """Messages the bot sent so far, waiting briefly for its worker threads."""
+    deadline = time.monotonic() + wait
+    seen = -1
+    while time.monotonic() < deadline:
+        time.sleep(0.2)
+        with _lock:
+            if len(SENT) == seen:
+                break
+            seen = len(SENT)
+    with _lock:
+        return [s["params"].get("text") for s in SENT if s["method"] == "sendMessage"]
+
+if __name__ == "__main__":
+    import os
+    install()
+    from shapeshift_server import app
+    client = app.test_client()
+    secret = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+    failed = False
+    for text in sys.argv[1:] or ["/start"]:
+        response = client.post("/telegram/webhook", data=update(text), headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+        print(f">>> {text}  [{response.status_code}]")
+        answers = replies()
+        for reply in answers[-3:]:
+            print(f"<<< {reply}")
+        failed |= response.status_code != 200 or not answers
+        SENT.clear()
+    sys.exit(1 if failed else 0)
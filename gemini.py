@@ -0,0 +1,30 @@
+"""
+Process-wide Gemini client, created on first use.
+Importing google.genai costs most of our cold start, so nothing imports it at module level.
+"""
+import os
+import threading
+
+_client = None
+_lock = threading.Lock()
+
+def is_configured():
+    """Cheap check for health endpoints — does not import the SDK."""
+    return bool(os.getenv("GEMINI_API_KEY"))
+
+def get_client():
+    """Returns the shared genai.Client, or None if the key or the SDK is missing."""
+    global _client
+    if _client is None and is_configured():
+        with _lock:
+            if _client is None:
+                try:
+                    from google import genai
+                except ImportError:
+                    return None
+                try:
+                    _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+                    print("READY: ShapeShift Engine Loaded (New SDK)", flush=True)
+                except Exception as e:
+                    print(f"ERROR: Gemini Init — {e}", flush=True)
+    return _client
@@ -0,0 +1,113 @@
+"""
+In-memory LRU of published site pages, gzip-compressed once and served from
+RAM. During a call campaign the same freshly generated pages are opened over
+and over; with this cache a hit touches neither the disk nor gzip.
+
+Entries are keyed by site ID and carry the page revision (site_store meta
+"revision"). Generation and edits put the new revision directly; other
+workers/nodes notice an edit by re-checking the revision at most every
+REVALIDATE seconds. Bounded by HOT_PAGES_MB (0 disables the cache).
+"""
+import os
+import gzip
+import time
+import threading
+from collections import OrderedDict
+
+import site_store
+
+MAX_BYTES = int(float(os.getenv("HOT_PAGES_MB", "64")) * 1024 * 1024)
+ENABLED = MAX_BYTES > 0
+REVALIDATE = float(os.getenv("HOT_PAGES_REVALIDATE", "2"))
+COMPRESS_LEVEL = 6
+
+_lock = threading.Lock()
+_pages = OrderedDict()
+_bytes = 0
+_counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+class Page:
+    __slots__ = ("site_id", "revision", "body", "size", "checked")
+
+    def __init__(self, site_id, revision, html):
+        raw = html.encode('utf-8')
+        self.site_id = site_id
+        self.revision = revision
+        self.body = gzip.compress(raw, COMPRESS_LEVEL)
+        self.size = len(raw)
+        self.checked = time.monotonic()
+
+    def html(self):
+        """Uncompressed bytes, for the rare client without gzip."""
+        return gzip.decompress(self.body)
+
+def put(site_id, html, revision):
+    """Caches (or replaces) the page of a site. Returns the cached Page."""
+    global _bytes
+    page = Page(site_id, revision, html)
+    if not ENABLED or len(page.body) > MAX_BYTES:
+        return page
+    with _lock:
+        old = _pages.pop(site_id, None)
+        if old:
+            _bytes -= len(old.body)
+        _pages[site_id] = page
+        _bytes += len(page.body)
+        while _bytes > MAX_BYTES and _pages:
+            _, evicted = _pages.popitem(last=False)
+            _bytes -= len(evicted.body)
+            _counters["evictions"] += 1
+    return page
+
+def invalidate(site_id):
+    global _bytes
+    with _lock:
+        old = _pages.pop(site_id, None)
+        if old:
+            _bytes -= len(old.body)
+
+def _cached(site_id):
+    with _lock:
+        page = _pages.get(site_id)
+        if page:
+            _pages.move_to_end(site_id)
+        return page
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+def page(query):
+    """The Page for a filename / site ID (resolved like site_store.resolve), loading it on a miss. None if unknown."""
+    site_id = site_store.site_id_from(query)
+    cached = _cached(site_id) if site_id else None
+    if cached and time.monotonic() - cached.checked < REVALIDATE:
+        _count("hits")
+        return cached
+
+    if cached is None:
+        site_id = site_store.resolve(query)
+        if not site_id:
+            return None
+        cached = _cached(site_id)
+    meta = site_store.load_meta(site_id) or {}
+    # Pages saved before revisions existed have none — only an edit (which sets one) can change them
+    if cached and meta.get("revision") in (None, cached.revision):
+        cached.checked = time.monotonic()
+        _count("hits")
+        return cached
+
+    _count("misses")
+    html = site_store.load_html(site_id)
+    if html is None:
+        invalidate(site_id)
+        return None
+    return put(site_id, html, meta.get("revision") or site_store.revision(html))
+
+def metrics():
+    with _lock:
+        total = _counters["hits"] + _counters["misses"]
+        return {
+            "enabled": ENABLED, "entries": len(_pages), "bytes": _bytes, "max_bytes": MAX_BYTES, **_counters,
+            "hit_rate": round(_counters["hits"] / total, 3) if total else None
+        }
@@ -0,0 +1,79 @@
+"""
+Fast local checks on generated pages, so a broken answer is repaired in place
+(continuation, missing sections, CTA, images) instead of regenerating the page.
+
+    problems = html_check.check(html, phone="0722123456")
+    # e.g. ["truncated", "missing:Servicii", "no_tel_cta", "few_images"]
+
+Outcome counters (first-try valid, repaired per problem, full retries) are
+exported by metrics() for /api/metrics.
+"""
+import re
+import threading
+from collections import Counter
+
+MIN_IMAGES = 4
+
+def _section(ids, heading):
+    """A section element with one of `ids`, or an h2/h3 whose text (inner tags allowed) contains `heading`."""
+    return re.compile(
+        rf'<(?:section|div)\b[^>]*\bid=["\']?(?:{ids})'
+        rf'|<h[23]\b[^>]*>(?:(?!</h[23]>).){{0,200}}?(?:{heading})',
+        re.IGNORECASE | re.DOTALL
+    )
+
+# Section name (as the generation prompt calls it) -> a lenient test for its presence.
+# Servicii/Testimoniale are matched on section ids or headings — the words alone show up in any body copy.
+SECTIONS = {
+    "Navbar": re.compile(r'<(nav|header)\b', re.IGNORECASE),
+    "Hero": re.compile(r'<h1\b', re.IGNORECASE),
+    "Servicii": _section(r'servic', r'servici|services'),
+    "Testimoniale": _section(r'testimonial|recenzi|review', r'testimonial|recenzi|review|părer'),
+    "Footer": re.compile(r'<footer\b', re.IGNORECASE),
+}
+IMAGE_RE = re.compile(r'<img\b|background-image\s*:\s*url\(', re.IGNORECASE)
+
+_lock = threading.Lock()
+_counters = Counter()
+
+def is_truncated(html):
+    """The model stopped before the end of the document (output limit, dropped stream)."""
+    return not html.rstrip().lower().endswith("</html>")
+
+def image_count(html):
+    return len(IMAGE_RE.findall(html))
+
+def check(html, phone=None):
+    """Returns the list of problems found (empty = good page). Cheap enough to run on every generation."""
+    problems = []
+    if is_truncated(html):
+        problems.append("truncated")
+    for name, pattern in SECTIONS.items():
+        if not pattern.search(html):
+            problems.append(f"missing:{name}")
+    if phone and 'href="tel:' not in html and "href='tel:" not in html:
+        problems.append("no_tel_cta")
+    if image_count(html) < MIN_IMAGES:
+        problems.append("few_images")
+    return problems
+
+def record(outcome, problems=()):
+    """outcome: 'valid' (first try), 'repaired', 'unrepaired' or 'full_retry'."""
+    with _lock:
+        _counters[outcome] += 1
+        for problem in problems:
+            _counters[f"problem:{problem}"] += 1
+
+def metrics():
+    with _lock:
+        counters = dict(_counters)
+    checked = sum(counters.get(k, 0) for k in ("valid", "repaired", "unrepaired"))
+    return {
+        "checked": checked,
+        "valid_first_try": counters.get("valid", 0),
+        "repaired": counters.get("repaired", 0),
+        "unrepaired": counters.get("unrepaired", 0),
+        "full_retries": counters.get("full_retry", 0),
+        "repair_rate": round(counters.get("repaired", 0) / checked, 3) if checked else None,
+        "problems": {k.split(':', 1)[1]: v for k, v in counters.items() if k.startswith("problem:")},
+    }
@@ -0,0 +1,191 @@
+"""
+Local proxy cache for the loremflickr.com images used by generated pages.
+
+Generated HTML is rewritten to /img/<w>x<h>/<keywords>/<lock> URLs. Each
+(keywords, size, lock) image is fetched from loremflickr once, then served from
+image_cache/ with long-lived caching, as WebP when the browser accepts it and
+resized with ?w=<width>. The cache is bounded by IMAGE_CACHE_MB and evicts the
+least recently used files. Resizing and WebP need Pillow; without it the
+original JPEG is served.
+"""
+import os
+import re
+import hashlib
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, 'image_cache')
+
+ENABLED = os.getenv("IMAGE_PROXY", "1") != "0"
+MAX_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_MB", "500")) * 1024 * 1024
+MAX_DIMENSION = 2000
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+SRCSET_WIDTHS = [480, 960]
+
+LOREMFLICKR_RE = re.compile(
+    r"https?://(?:www\.)?loremflickr\.com/(?:g/)?(\d{1,4})/(\d{1,4})/([A-Za-z0-9,_\-]+)(?:/all)?(?:\?lock=(\d{1,6}))?"
+)
+PROXY_IMG_RE = re.compile(r'<img\b[^>]*\bsrc="(/img/(\d+)x\d+/[^"]+)"[^>]*>', re.IGNORECASE)
+KEYWORDS_RE = re.compile(r'^[a-z0-9,_\-]{1,100}$')
+
+# Striped locks: one download/resize per image at a time without an ever-growing lock table
+_key_locks = [threading.Lock() for _ in range(64)]
+_evict_lock = threading.Lock()
+_cache_bytes = None
+_prefetch_pool = ThreadPoolExecutor(max_workers=4)
+
+@lru_cache(maxsize=None)
+def load_pil():
+    """Pillow's Image module, imported on first use (None if Pillow is not installed)."""
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        return None
+
+def _proxy_url(match):
+    width, height, keywords, lock = match.group(1), match.group(2), match.group(3).lower(), match.group(4) or "0"
+    return f"/img/{width}x{height}/{keywords}/{lock}"
+
+def _add_srcset(match):
+    tag, src, width = match.group(0), match.group(1), int(match.group(2))
+    if 'srcset=' in tag.lower():
+        return tag
+    widths = [w for w in SRCSET_WIDTHS if w < width]
+    if not widths:
+        return tag
+    srcset = ", ".join([f"{src}?w={w} {w}w" for w in widths] + [f"{src} {width}w"])
+    return tag.replace(f'src="{src}"', f'src="{src}" srcset="{srcset}" sizes="100vw"', 1)
+
+def rewrite_html(html):
+    """Points every loremflickr image at the local proxy (and gives <img> tags a responsive srcset)."""
+    if not ENABLED:
+        return html
+    html = LOREMFLICKR_RE.sub(_proxy_url, html)
+    if load_pil() is not None:
+        html = PROXY_IMG_RE.sub(_add_srcset, html)
+    return html
+
+def _key(width, height, keywords, lock):
+    return hashlib.sha1(f"{width}x{height}/{keywords}/{lock}".encode()).hexdigest()
+
+def _lock_for(key):
+    return _key_locks[int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) % len(_key_locks)]
+
+def _path(name):
+    return os.path.join(CACHE_DIR, name[:2], name)
+
+def _touch(path):
+    # mtime doubles as "last used" for LRU eviction (atime is often disabled)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _store(path, data):
+    global _cache_bytes
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with _evict_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(os.path.getsize(p) for p, _ in _cached_files())
+        else:
+            _cache_bytes += len(data)
+    if _cache_bytes > MAX_CACHE_BYTES:
+        evict()
+
+def _cached_files():
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith('.tmp'):
+                path = os.path.join(root, name)
+                yield path, os.path.getmtime(path)
+
+def evict(target=None):
+    """Deletes least recently used files until the cache is under `target` bytes (default: 90% of the limit)."""
+    global _cache_bytes
+    target = MAX_CACHE_BYTES * 0.9 if target is None else target
+    with _evict_lock:
+        files = sorted(_cached_files(), key=lambda item: item[1])
+        total = sum(os.path.getsize(p) for p, _ in files)
+        for path, _ in files:
+            if total <= target:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        _cache_bytes = total
+
+def fetch_original(width, height, keywords, lock):
+    """Returns the path of the cached original, downloading it once. Raises ValueError on bad input."""
+    if not (0 < width <= MAX_DIMENSION and 0 < height <= MAX_DIMENSION) or not KEYWORDS_RE.match(keywords):
+        raise ValueError("Invalid image request")
+
+    key = _key(width, height, keywords, lock)
+    path = _path(f"{key}.jpg")
+    if os.path.exists(path):
+        _touch(path)
+        return path
+
+    # One download per image even if a page's visitors all ask at once
+    with _lock_for(key):
+        if os.path.exists(path):
+            return path
+        import requests
+        response = requests.get(f"https://loremflickr.com/{width}/{height}/{keywords}/all?lock={lock}", timeout=15)
+        response.raise_for_status()
+        if len(response.content) > MAX_IMAGE_BYTES or not response.headers.get("Content-Type", "").startswith("image/"):
+            raise ValueError("Unexpected image response")
+        _store(path, response.content)
+        return path
+
+def get_variant(width, height, keywords, lock, target_width=None, webp=False):
+    """Returns (path, mimetype) for the requested variant, building it from the original when needed."""
+    # Only the widths rewrite_html emits — each distinct width is a resize and a cached file
+    if target_width is not None and target_width not in SRCSET_WIDTHS:
+        raise ValueError(f"Unsupported width {target_width}")
+    original = fetch_original(width, height, keywords, lock)
+    Image = load_pil()
+    if Image is None or (not webp and not target_width):
+        return original, 'image/jpeg'
+
+    target_width = min(target_width or width, width)
+    ext, mimetype = ('webp', 'image/webp') if webp else ('jpg', 'image/jpeg')
+    key = _key(width, height, keywords, lock)
+    path = _path(f"{key}_{target_width}.{ext}")
+    if os.path.exists(path):
+        _touch(path)
+        return path, mimetype
+
+    with _lock_for(f"{key}_{target_width}.{ext}"):
+        if not os.path.exists(path):
+            import io
+            with Image.open(original) as img:
+                img = img.convert('RGB')
+                if target_width < img.width:
+                    img = img.resize((target_width, round(img.height * target_width / img.width)), Image.LANCZOS)
+                buf = io.BytesIO()
+                img.save(buf, 'WEBP' if webp else 'JPEG', quality=80)
+            _store(path, buf.getvalue())
+    return path, mimetype
+
+def prefetch(html):
+    """Warms the cache for every proxied image of a freshly generated page, in the background."""
+    if not ENABLED:
+        return
+    for width, height, keywords, lock in set(re.findall(r"/img/(\d+)x(\d+)/([a-z0-9,_\-]+)/(\d+)", html)):
+        _prefetch_pool.submit(_prefetch_one, int(width), int(height), keywords, int(lock))
+
+def _prefetch_one(width, height, keywords, lock):
+    try:
+        fetch_original(width, height, keywords, lock)
+    except Exception as e:
+        print(f"[IMG] Prefetch failed for {keywords}/{lock}: {e}", flush=True)
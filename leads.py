@@ -1,6 +1,7 @@
 import os
 import requests
 from dotenv import load_dotenv
+import usage
 load_dotenv()
 
 class LeadGenerator:
@@ -12,9 +13,10 @@ class LeadGenerator:
         self.api_key = api_key or os.getenv("SERP_API_KEY")
         self.base_url = "https://serpapi.com/search"
 
-    def find_leads(self, location="Bucuresti, Romania", query="service auto", limit=10):
+    def find_leads(self, location="Bucuresti, Romania", query="service auto", limit=10, skip=None):
         """
         Searches for businesses without websites, then enriches each with reviews + street view.
+        `skip(biz)` can reject already-processed businesses before we pay for their reviews.
         """
         if not self.api_key:
             print("Warning: No SERP_API_KEY found.")
@@ -34,6 +36,7 @@ class LeadGenerator:
 
             try:
                 response = requests.get(self.base_url, params=params)
+                usage.record_serpapi("google_maps")
                 data = response.json()
                 results = data.get("local_results", [])
                 
@@ -42,6 +45,8 @@ class LeadGenerator:
 
                 for biz in results:
                     if biz.get("phone") and not biz.get("website"):
+                        if skip and skip(biz):
+                            continue
                         place_id = biz.get("place_id", "")
                         lead = {
                             "name": biz.get("title"),
@@ -91,6 +96,7 @@ class LeadGenerator:
                 "sort_by": "qualityScore"
             }
             response = requests.get(self.base_url, params=params, timeout=8)
+            usage.record_serpapi("google_maps_reviews")
             data = response.json()
             raw_reviews = data.get("reviews", [])
             reviews = []
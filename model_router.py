@@ -0,0 +1,187 @@
+"""
+Routes Gemini calls over a fallback chain of models.
+
+Every call is timed into a per-model scoreboard. If the primary model has not
+answered after its p90 latency, the next model in the chain is fired as a hedge
+and the first valid answer wins. Errors fall through to the next model
+immediately, and nothing ever waits past the caller's deadline.
+"""
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import usage
+
+def _chain(env_name, default):
+    return [m.strip() for m in os.getenv(env_name, default).split(',') if m.strip()]
+
+GENERATION_CHAIN = _chain("GEN_MODELS", "gemini-2.5-flash,gemini-2.0-flash")
+EDIT_CHAIN = _chain("EDIT_MODELS", "gemini-3.1-pro-preview,gemini-2.5-flash")
+# Used instead of any chain once the caller's channel is over its daily token budget
+CHEAP_CHAIN = _chain("CHEAP_MODELS", "gemini-2.0-flash-lite")
+
+# Total budget for one generation (seconds) — must stay below the gunicorn timeout
+GEN_DEADLINE = float(os.getenv("GEN_DEADLINE", "100"))
+# Hedge delay used until a model has enough samples for a p90
+DEFAULT_HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "30"))
+MIN_SAMPLES = 5
+# Consecutive errors before a model is put on cooldown (and moved to the end of its chain)
+MAX_ERRORS = 3
+COOLDOWN = 60
+
+# Model calls are network-bound: a slot per in-flight call (primary + hedge) of every concurrent generation
+ROUTER_WORKERS = int(os.getenv("ROUTER_WORKERS", "32"))
+_pool = ThreadPoolExecutor(max_workers=ROUTER_WORKERS)
+
+class Scoreboard:
+    """Rolling per-model latency and error statistics."""
+    def __init__(self, window=50):
+        self.window = window
+        self.lock = threading.Lock()
+        self.models = {}
+
+    def _entry(self, model):
+        return self.models.setdefault(model, {
+            "latencies": deque(maxlen=self.window), "ok": 0, "errors": 0,
+            "consecutive_errors": 0, "cooldown_until": 0
+        })
+
+    def record(self, model, latency, ok):
+        with self.lock:
+            e = self._entry(model)
+            if ok:
+                e["ok"] += 1
+                e["consecutive_errors"] = 0
+                e["latencies"].append(latency)
+            else:
+                e["errors"] += 1
+                e["consecutive_errors"] += 1
+                if e["consecutive_errors"] >= MAX_ERRORS:
+                    e["cooldown_until"] = time.monotonic() + COOLDOWN
+
+    def p90(self, model):
+        with self.lock:
+            latencies = sorted(self._entry(model)["latencies"])
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.9) - 1)]
+
+    def is_healthy(self, model):
+        with self.lock:
+            return self._entry(model)["cooldown_until"] <= time.monotonic()
+
+    def snapshot(self):
+        result = {}
+        for model in list(self.models):
+            e = self.models[model]
+            result[model] = {
+                "ok": e["ok"], "errors": e["errors"], "p90": self.p90(model),
+                "healthy": self.is_healthy(model)
+            }
+        return result
+
+SCOREBOARD = Scoreboard()
+
+def _chain_env(chain):
+    """Name of the env var a chain comes from, for error messages."""
+    for name, configured in (("GEN_MODELS", GENERATION_CHAIN), ("EDIT_MODELS", EDIT_CHAIN), ("CHEAP_MODELS", CHEAP_CHAIN)):
+        if chain is configured:
+            return name
+    return "the chain passed to ModelRouter.generate()"
+
+def deadline_in(seconds=GEN_DEADLINE):
+    """Absolute deadline (time.monotonic based) to pass down the call chain."""
+    return time.monotonic() + seconds
+
+def remaining(deadline):
+    return max(0.0, deadline - time.monotonic())
+
+class ModelRouter:
+    def __init__(self, client, scoreboard=SCOREBOARD):
+        self.client = client
+        self.scoreboard = scoreboard
+
+    def _call(self, model, prompt, timeout, config, tags=None, validate=None):
+        """One model call. Returns the validated text; an invalid answer raises and scores like an error."""
+        from google.genai import types
+        started = time.monotonic()
+        try:
+            response = self.client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    http_options=types.HttpOptions(timeout=max(1, int(timeout * 1000))),
+                    **(config or {})
+                )
+            )
+            usage.record_gemini(model, response, tags)
+            text = validate(response.text or "") if validate else response.text or ""
+            if not text:
+                raise ValueError(f"{model} returned an invalid answer")
+        except Exception:
+            self.scoreboard.record(model, time.monotonic() - started, ok=False)
+            raise
+        self.scoreboard.record(model, time.monotonic() - started, ok=True)
+        return text
+
+    def _ordered(self, chain):
+        healthy = [m for m in chain if self.scoreboard.is_healthy(m)]
+        return healthy + [m for m in chain if m not in healthy]
+
+    def generate(self, prompt, chain=None, deadline=None, validate=None, hedge=True, config=None):
+        """
+        Returns the first valid text produced by the chain. `validate(text)` returns the
+        cleaned text or None; invalid answers count like errors and fall through.
+        Raises TimeoutError when the deadline passes, or the last error if every model failed.
+        """
+        # Captured here: the calls themselves run on pool threads that don't carry the caller's tags
+        tags = usage.current_tags()
+        chain = chain or GENERATION_CHAIN
+        if usage.over_token_budget(tags.get("channel")):
+            print(f"💸 [ROUTER] '{tags['channel']}' is over its daily token budget, using {', '.join(CHEAP_CHAIN)}", flush=True)
+            chain, hedge = CHEAP_CHAIN, False
+        if not chain:
+            raise RuntimeError(f"No models configured — set {_chain_env(chain)}")
+        models = self._ordered(chain)
+        deadline = deadline or deadline_in()
+        validate = validate or (lambda text: text.strip() or None)
+        pending = {}
+        last_error = None
+
+        def launch():
+            model = models.pop(0)
+            pending[_pool.submit(self._call, model, prompt, remaining(deadline), config, tags, validate)] = model
+            return model
+
+        launch()
+        while pending:
+            if remaining(deadline) <= 0:
+                raise TimeoutError(f"Generation deadline exceeded (waiting on {', '.join(pending.values())})")
+
+            timeout = remaining(deadline)
+            if hedge and models:
+                primary = next(iter(pending.values()))
+                timeout = min(timeout, self.scoreboard.p90(primary) or DEFAULT_HEDGE_DELAY)
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if hedge and models and remaining(deadline) > 0:
+                    print(f"🐢 [ROUTER] {next(iter(pending.values()))} is slow, hedging with {models[0]}", flush=True)
+                    launch()
+                continue
+
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+                print(f"⚠️ [ROUTER] {model} failed: {last_error}", flush=True)
+
+            if not pending and models:
+                launch()
+
+        raise last_error or RuntimeError("No model available")
@@ -0,0 +1,229 @@
+"""
+In-process sampling profiler and slow-request capture (stdlib only).
+
+profile(seconds) samples every thread's stack with sys._current_frames() and
+returns collapsed stacks ("frame;frame;frame count" per line) — the input
+format of flamegraph.pl and speedscope. It profiles the process it runs in: a
+gunicorn worker for /admin/profile, the bot process for /profile.
+
+start_profile() runs it on a background thread and writes the result to
+PROFILE_DIR, so a sync web worker keeps serving (and being sampled) while it
+runs; any worker of the node can then return the file.
+
+Requests and bot jobs wrapped in tracked() are timed; while one runs past
+half of SLOW_REQUEST_MS its thread is sampled, and if it ends up slower than
+SLOW_REQUEST_MS it is kept (duration, phase() breakdown, stacks) in a ring of
+the last SLOW_RING entries.
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_PROFILE_SECONDS = 60
+# A .running marker older than the profile's length plus this belongs to a worker that died mid-profile
+PROFILE_GRACE_SECONDS = 30
+# 0 disables slow-request capture
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "5000"))
+SLOW_SAMPLE_INTERVAL = float(os.getenv("SLOW_SAMPLE_INTERVAL_MS", "50")) / 1000
+SLOW_RING = int(os.getenv("SLOW_RING", "50"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_ID_RE = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+_local = threading.local()
+_inflight = {}
+_inflight_lock = threading.Lock()
+_slow = deque(maxlen=SLOW_RING)
+_profile_lock = threading.Lock()
+_watcher = None
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def collapse(frame):
+    """Root-first 'file:function;file:function' string for a frame."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def format_collapsed(counter):
+    return "\n".join(f"{stack} {count}" for stack, count in counter.most_common())
+
+def _sample(seconds, interval):
+    seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = Counter()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                stacks[f"{names.get(ident, ident)};{collapse(frame)}"] += 1
+        time.sleep(interval)
+    return format_collapsed(stacks)
+
+def profile(seconds=10, interval=SAMPLE_INTERVAL):
+    """Samples every thread of this process for `seconds` and returns collapsed stacks. One profile at a time."""
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        return _sample(seconds, interval)
+    finally:
+        _profile_lock.release()
+
+def _profile_path(profile_id, suffix):
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{suffix}")
+
+def start_profile(seconds=10):
+    """Starts profile() in the background. Returns the profile ID to pass to profile_result()."""
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # The marker holds the duration, so any worker can tell a dead run from a long one
+        with open(_profile_path(profile_id, "running"), 'w') as f:
+            f.write(str(seconds))
+    except OSError:
+        _profile_lock.release()
+        raise
+
+    def run():
+        try:
+            result = _sample(seconds, SAMPLE_INTERVAL)
+        except Exception as e:
+            result = f"# profile failed: {e}"
+        finally:
+            _profile_lock.release()
+        with open(_profile_path(profile_id, "txt.tmp"), 'w') as f:
+            f.write(result)
+        os.replace(_profile_path(profile_id, "txt.tmp"), _profile_path(profile_id, "txt"))
+        os.remove(_profile_path(profile_id, "running"))
+
+    threading.Thread(target=run, name="profiler", daemon=True).start()
+    return profile_id
+
+def profile_result(profile_id):
+    """('done', collapsed stacks) | ('running', None) | ('failed', None) | ('unknown', None).
+
+    'failed' means the worker running the profile was killed or restarted
+    before it wrote the result: its marker outlived the profile's duration.
+    """
+    if not PROFILE_ID_RE.match(profile_id or ""):
+        return "unknown", None
+    try:
+        with open(_profile_path(profile_id, "txt")) as f:
+            return "done", f.read()
+    except FileNotFoundError:
+        pass
+    marker = _profile_path(profile_id, "running")
+    try:
+        started = os.path.getmtime(marker)
+        with open(marker) as f:
+            recorded = f.read()
+    except FileNotFoundError:
+        return "unknown", None
+    try:
+        seconds = min(max(float(recorded), 0.1), MAX_PROFILE_SECONDS)
+    except ValueError:
+        seconds = MAX_PROFILE_SECONDS
+    if time.time() - started > seconds + PROFILE_GRACE_SECONDS:
+        return "failed", None
+    return "running", None
+
+# --- Slow requests ---------------------------------------------------------
+
+class _Tracked:
+    def __init__(self, name):
+        self.name = name
+        self.thread = threading.get_ident()
+        self.started = time.monotonic()
+        self.wall_started = datetime.now().isoformat(timespec='seconds')
+        self.phases = []
+        self.stacks = Counter()
+        self.parent = None
+
+def begin(name):
+    """Starts timing the current thread's request/job. Pair with end()."""
+    entry = _Tracked(name)
+    # Nested tracking (a tracked job inside a request) resumes the outer one when it ends
+    entry.parent = getattr(_local, "entry", None)
+    _local.entry = entry
+    if SLOW_REQUEST_MS > 0:
+        with _inflight_lock:
+            _inflight[entry.thread] = entry
+        _start_watcher()
+    return entry
+
+def end(entry, **details):
+    """Stops timing; keeps the entry in the slow ring if it crossed SLOW_REQUEST_MS."""
+    _local.entry = entry.parent
+    with _inflight_lock:
+        if entry.parent is not None:
+            _inflight[entry.thread] = entry.parent
+        else:
+            _inflight.pop(entry.thread, None)
+    duration_ms = (time.monotonic() - entry.started) * 1000
+    if SLOW_REQUEST_MS > 0 and duration_ms >= SLOW_REQUEST_MS:
+        _slow.append({
+            "name": entry.name, "started": entry.wall_started, "duration_ms": round(duration_ms),
+            "phases": entry.phases, "samples": sum(entry.stacks.values()),
+            "stacks": format_collapsed(entry.stacks), **details
+        })
+        print(f"🐌 [PROFILE] Slow: {entry.name} took {duration_ms:.0f} ms", flush=True)
+    return duration_ms
+
+@contextmanager
+def tracked(name):
+    entry = begin(name)
+    try:
+        yield entry
+    finally:
+        end(entry)
+
+@contextmanager
+def phase(name):
+    """Times one step of the current tracked request (no-op outside one)."""
+    entry = getattr(_local, "entry", None)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        if entry is not None:
+            entry.phases.append({"phase": name, "ms": round((time.monotonic() - started) * 1000)})
+
+def slow_requests():
+    """The ring of slow requests, newest first."""
+    return list(reversed(_slow))
+
+def _watch():
+    # Only threads already running for half the threshold are sampled — fast requests cost nothing
+    while True:
+        time.sleep(SLOW_SAMPLE_INTERVAL)
+        horizon = time.monotonic() - SLOW_REQUEST_MS / 2000
+        with _inflight_lock:
+            due = [e for e in _inflight.values() if e.started <= horizon]
+        if not due:
+            continue
+        frames = sys._current_frames()
+        for entry in due:
+            frame = frames.get(entry.thread)
+            if frame is not None:
+                entry.stacks[collapse(frame)] += 1
+
+def _start_watcher():
+    global _watcher
+    if _watcher is None:
+        with _inflight_lock:
+            if _watcher is None:
+                _watcher = threading.Thread(target=_watch, name="slow-request-watcher", daemon=True)
+                _watcher.start()
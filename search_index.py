@@ -0,0 +1,167 @@
+"""
+Local full-text + faceted search over generated sites (SQLite FTS5).
+
+Every generate/edit upserts one row: metadata (name, category, city, phone,
+address, extra_info) plus the page's visible text. Queries use the FTS index
+for text and plain indexed columns for facets.
+
+    python search_index.py rebuild      # index every existing site
+"""
+import os
+import re
+import sys
+import sqlite3
+import time
+import threading
+import html as html_lib
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEARCH_DB = os.getenv("SEARCH_DB", os.path.join(BASE_DIR, 'search.db'))
+
+MAX_TEXT = 20000
+# Facet counts over large result sets are the slow part of a query — reuse them briefly
+FACET_TTL = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    site_id TEXT PRIMARY KEY,
+    biz_name TEXT,
+    category TEXT,
+    city TEXT,
+    phone TEXT,
+    filename TEXT,
+    created TEXT
+);
+-- Covering indexes: facet filters + newest-first ordering never touch the table
+CREATE INDEX IF NOT EXISTS sites_category_city ON sites(category, city, created);
+CREATE INDEX IF NOT EXISTS sites_city_category ON sites(city, category);
+CREATE INDEX IF NOT EXISTS sites_created ON sites(created);
+CREATE VIRTUAL TABLE IF NOT EXISTS sites_fts USING fts5(
+    site_id UNINDEXED, biz_name, category, address, phone, extra_info, body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_local = threading.local()
+_schema_ready = set()
+_facet_cache = {}
+
+@contextmanager
+def _connect(path=None):
+    path = path or SEARCH_DB
+    # One connection per thread: cheap queries, no cross-thread sharing
+    db = getattr(_local, path, None)
+    if db is None:
+        db = sqlite3.connect(path, timeout=10)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        setattr(_local, path, db)
+    if path not in _schema_ready:
+        db.executescript(SCHEMA)
+        _schema_ready.add(path)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def visible_text(page):
+    """Text a visitor would read: no head, scripts, styles or tags."""
+    page = re.sub(r'<(head|script|style|svg)\b.*?</\1>', ' ', page, flags=re.IGNORECASE | re.DOTALL)
+    page = re.sub(r'<[^>]+>', ' ', page)
+    return re.sub(r'\s+', ' ', html_lib.unescape(page)).strip()[:MAX_TEXT]
+
+def city_from(address):
+    """'Str. Memorandumului 12, Cluj-Napoca 400114' -> 'cluj-napoca' (best effort)."""
+    parts = [p.strip() for p in (address or "").split(',') if p.strip()]
+    parts = [p for p in parts if p.lower() not in ("romania", "românia")]
+    if not parts:
+        return None
+    city = re.sub(r'\d+', '', parts[-1]).strip().lower()
+    return city or None
+
+def index_site(meta, page=None):
+    """Upserts one site. `meta` is the site_store metadata (plus optional address/phone/extra_info)."""
+    site_id = meta["id"]
+    with _connect() as db:
+        db.execute(
+            "INSERT OR REPLACE INTO sites (site_id, biz_name, category, city, phone, filename, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (site_id, meta.get("biz_name"), (meta.get("category") or "").lower() or None,
+             city_from(meta.get("address")), meta.get("phone"), meta.get("filename"), meta.get("created"))
+        )
+        db.execute("DELETE FROM sites_fts WHERE site_id = ?", (site_id,))
+        db.execute(
+            "INSERT INTO sites_fts (site_id, biz_name, category, address, phone, extra_info, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (site_id, meta.get("biz_name"), meta.get("category"), meta.get("address"), meta.get("phone"),
+             meta.get("extra_info"), visible_text(page) if page else None)
+        )
+
+def remove_site(site_id):
+    with _connect() as db:
+        db.execute("DELETE FROM sites WHERE site_id = ?", (site_id,))
+        db.execute("DELETE FROM sites_fts WHERE site_id = ?", (site_id,))
+
+def _fts_query(text):
+    # Every word must match, as a prefix — user input never reaches FTS syntax
+    words = re.findall(r'\w+', text or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+def search(query="", category=None, city=None, limit=20):
+    """Returns {"results": [...], "facets": {"category": {...}, "city": {...}}}."""
+    where, params = [], []
+    fts = _fts_query(query)
+    if fts:
+        where.append("s.site_id IN (SELECT site_id FROM sites_fts WHERE sites_fts MATCH ?)")
+        params.append(fts)
+    if category:
+        where.append("s.category = ?")
+        params.append(category.lower())
+    if city:
+        where.append("s.city = ?")
+        params.append(city.lower())
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    # SQLite treats a negative LIMIT as none
+    limit = max(1, int(limit))
+
+    with _connect() as db:
+        rows = db.execute(
+            f"SELECT s.* FROM sites s {clause} ORDER BY s.created DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        cache_key = (clause, tuple(params))
+        cached = _facet_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            facets = cached[1]
+        else:
+            facets = {}
+            for facet in ("category", "city"):
+                counts = db.execute(
+                    f"SELECT s.{facet} AS value, COUNT(*) AS n FROM sites s {clause} GROUP BY s.{facet} ORDER BY n DESC LIMIT 10",
+                    params
+                ).fetchall()
+                facets[facet] = {r["value"]: r["n"] for r in counts if r["value"]}
+            if len(_facet_cache) > 1000:
+                _facet_cache.clear()
+            _facet_cache[cache_key] = (time.monotonic() + FACET_TTL, facets)
+    return {"results": [dict(r) for r in rows], "facets": facets}
+
+def rebuild():
+    """Indexes every live site from site_store."""
+    import site_store
+    count = 0
+    for site_id in site_store.iter_site_ids():
+        meta = site_store.load_meta(site_id)
+        if meta:
+            index_site(meta, site_store.load_html(site_id))
+            count += 1
+    with _connect() as db:
+        db.execute("ANALYZE")
+    print(f"🔎 [SEARCH] Indexed {count} sites", flush=True)
+    return count
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild()
+    else:
+        print(__doc__)
@@ -1,11 +1,14 @@
 import os
+import sys
+import fcntl
 import telebot
 import base64
 import io
 from telebot import types
 from core import generate_and_save, update_site_links, send_verification_code, verify_code, notify_admin_site_created
-from leads import LeadGenerator
-from caller import ColdCaller
+from campaigns import CampaignStore, FOUND, SITE_GENERATED, CALLED
+import usage
+import profiler
 import threading
 import time
 from dotenv import load_dotenv
@@ -14,16 +17,20 @@ load_dotenv()
 
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 PUBLIC_URL = os.getenv("PUBLIC_URL", "https://your-app-name.railway.app")
+# polling: this script runs its own loop | webhook: updates arrive on the server's /telegram/webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-if not TOKEN:
-    print("WARNING: TELEGRAM_BOT_TOKEN not found. Bot disabled.")
-    exit(0)
-
-bot = telebot.TeleBot(TOKEN)
+# Importable without a token (the server imports it in webhook mode); only running it needs one
+bot = telebot.TeleBot(TOKEN or "0:disabled", num_threads=int(os.getenv("BOT_WORKERS", "4")))
+campaign_store = CampaignStore()
 
 # In-memory storage for user sessions
 user_sessions = {}
 ADMIN_ID = int(os.getenv("ADMIN_ID", "7725170652"))
+# How often queued campaigns are checked against the daily budget (seconds)
+BUDGET_CHECK_INTERVAL = int(os.getenv("BUDGET_CHECK_INTERVAL", "600"))
 
 def admin_only(func):
     def wrapper(message):
@@ -165,7 +172,8 @@ def handle_info_steps(message):
     elif step == 'edit_info':
         site_id = user_sessions[chat_id].get('last_site_id')
         bot.send_message(chat_id, "⚡ Actualizăm link-urile... Stai așa.")
-        success, res = update_site_links(site_id, message.text)
+        with usage.tag(channel="telegram"), profiler.tracked("bot:edit"):
+            success, res = update_site_links(site_id, message.text)
         if success:
             url = f"{PUBLIC_URL}/demos/{res}"
             bot.send_message(chat_id, f"Actualizat! ✅ Noile info sunt acum live pe site.\n\n🔗 [Vezi Schimbările]({url})", parse_mode='Markdown')
@@ -194,17 +202,141 @@ def run_campaign_logic(message):
     
     bot.send_message(chat_id, f"🔍 Scanăm Google Maps pentru **{niche}** în **{loc}**...\n\nTe voi informa pe măsură ce avansăm.", parse_mode='Markdown')
     
+    campaign_id = campaign_store.create_campaign(chat_id, niche, loc)
+
     # Run in background to not block the bot
-    threading.Thread(target=campaign_worker, args=(chat_id, niche, loc)).start()
+    threading.Thread(target=campaign_worker, args=(campaign_id,)).start()
+
+@bot.message_handler(commands=['campaigns'])
+@admin_only
+def list_campaigns(message):
+    campaigns = campaign_store.summary()
+    if not campaigns:
+        bot.send_message(message.chat.id, "Nu există campanii încă. Pornește una cu /campaign.")
+        return
+
+    lines = ["📋 **Campanii recente**\n"]
+    for c in campaigns:
+        counts = c['counts']
+        total = sum(counts.values())
+        lines.append(
+            f"#{c['id']} **{c['niche']}**, {c['location']} — `{c['status']}`\n"
+            f"   👥 {total} lead-uri | 🌐 {counts.get(SITE_GENERATED, 0)} site-uri | 📞 {counts.get(CALLED, 0)} apeluri"
+        )
+    bot.send_message(message.chat.id, "\n".join(lines), parse_mode='Markdown')
+
+@bot.message_handler(commands=['find'])
+@admin_only
+def find_sites(message):
+    import search_index
+    query = message.text.split(maxsplit=1)[1] if len(message.text.split(maxsplit=1)) > 1 else ""
+    if not query:
+        bot.send_message(message.chat.id, "Folosește: `/find pizzerie cluj`", parse_mode='Markdown')
+        return
+
+    results = search_index.search(query, limit=10)["results"]
+    if not results:
+        bot.send_message(message.chat.id, f"🔎 Niciun site găsit pentru „{query}”.")
+        return
+
+    lines = [f"🔎 **{len(results)} rezultate pentru „{query}”**\n"]
+    for r in results:
+        lines.append(f"🏢 [{r['biz_name']}]({PUBLIC_URL}/demos/{r['filename']}) — `{r['site_id']}`\n   {r['category'] or ''} {('· ' + r['city']) if r['city'] else ''} · {(r['created'] or '')[:10]}")
+    bot.send_message(message.chat.id, "\n".join(lines), parse_mode='Markdown', disable_web_page_preview=True)
 
-def campaign_worker(chat_id, niche, loc):
+@bot.message_handler(commands=['usage'])
+@admin_only
+def usage_report(message):
+    usage.sync_retell_minutes()
+    rows = usage.rollup(days=7)
+    if not rows:
+        bot.send_message(message.chat.id, "Niciun consum înregistrat în ultimele 7 zile.")
+        return
+
+    lines = ["💸 **Consum API (7 zile)**"]
+    day = None
+    for r in rows:
+        if r['day'] != day:
+            day = r['day']
+            lines.append(f"\n📅 **{day}**")
+        if r['kind'] == 'gemini':
+            amount = f"{r['prompt_tokens'] + r['output_tokens']:,} tokeni ({r['prompt_tokens']:,} in / {r['output_tokens']:,} out)"
+        elif r['kind'] == 'retell':
+            amount = f"{r['requests']} apeluri, {r['minutes']:.1f} min"
+        else:
+            amount = f"{r['requests']} cereri"
+        lines.append(f"   {r['channel']} · {r['kind']}: {amount}")
+    bot.send_message(message.chat.id, "\n".join(lines), parse_mode='Markdown')
+
+@bot.message_handler(commands=['profile'])
+@admin_only
+def profile_cmd(message):
+    parts = message.text.split()
+    seconds = float(parts[1]) if len(parts) > 1 and parts[1].replace('.', '', 1).isdigit() else 10
+    bot.send_message(message.chat.id, f"🔬 Profilez procesul botului {min(seconds, profiler.MAX_PROFILE_SECONDS):.0f}s...")
+    try:
+        stacks = profiler.profile(seconds)
+    except RuntimeError as e:
+        bot.send_message(message.chat.id, f"⚠️ {e}")
+        return
+    doc = io.BytesIO(stacks.encode('utf-8'))
+    doc.name = f"profile-{os.getpid()}.txt"
+    bot.send_document(message.chat.id, doc, caption="Stack-uri colapsate — deschide în speedscope.app sau flamegraph.pl")
+
+@bot.message_handler(commands=['slow'])
+@admin_only
+def slow_cmd(message):
+    import json
+    slow = profiler.slow_requests()
+    if not slow:
+        bot.send_message(message.chat.id, f"🐌 Nicio cerere peste {profiler.SLOW_REQUEST_MS:.0f} ms în acest proces.")
+        return
+    lines = [f"🐌 **Cereri lente ({len(slow)})**"]
+    for r in slow[:10]:
+        phases = ", ".join(f"{p['phase']} {p['ms']}ms" for p in r['phases'])
+        lines.append(f"`{r['name']}` — {r['duration_ms']} ms ({r['started'][11:]})" + (f"\n   {phases}" if phases else ""))
+    bot.send_message(message.chat.id, "\n".join(lines), parse_mode='Markdown')
+    doc = io.BytesIO(json.dumps(slow, ensure_ascii=False, indent=1).encode('utf-8'))
+    doc.name = f"slow-{os.getpid()}.json"
+    bot.send_document(message.chat.id, doc)
+
+def _queue_campaign(campaign_id, chat_id, reason):
+    campaign_store.set_status(campaign_id, 'queued')
+    bot.send_message(chat_id, f"⏸️ Campania #{campaign_id} a atins limita zilnică ({reason}). O reluăm automat când bugetul permite.")
+
+def campaign_worker(campaign_id):
+    with usage.tag(channel="campaign"):
+        _run_campaign(campaign_id)
+
+def _run_campaign(campaign_id):
+    # Imported here so users who only chat never load the campaign SDKs
+    from leads import LeadGenerator
+    from caller import ColdCaller
+
+    campaign = campaign_store.get_campaign(campaign_id)
+    chat_id = campaign['chat_id']
     try:
         lg = LeadGenerator()
         caller = ColdCaller()
-        
-        leads = lg.find_leads(location=loc, query=niche, limit=5)
+
+        blocked = usage.campaign_blocked()
+        if blocked:
+            _queue_campaign(campaign_id, chat_id, blocked)
+            return
+
+        # A campaign queued before its search has no leads yet
+        if campaign['status'] == 'searching' or (campaign['status'] == 'queued' and not campaign_store.leads(campaign_id)):
+            # Skip businesses any previous campaign already found, before paying for their reviews
+            found = lg.find_leads(location=campaign['location'], query=campaign['niche'], limit=5, skip=campaign_store.is_known)
+            campaign_store.add_leads(campaign_id, found)
+            campaign_store.set_status(campaign_id, 'running')
+        elif campaign['status'] == 'queued':
+            campaign_store.set_status(campaign_id, 'running')
+
+        leads = campaign_store.leads(campaign_id)
         
         if not leads:
+            campaign_store.set_status(campaign_id, 'done')
             bot.send_message(chat_id, "❌ Nu am găsit lead-uri noi fără website în această zonă.")
             return
 
@@ -214,37 +346,57 @@ def campaign_worker(chat_id, niche, loc):
         for i, lead in enumerate(leads):
             bot.send_message(chat_id, f"🏢 **{i+1}. {lead['name']}**\n📞 `{lead['phone']}`\n📍 _{lead['address']}_", parse_mode='Markdown')
             
+        pending = [l for l in leads if l['state'] in (FOUND, SITE_GENERATED)]
+        # One batched Gemini call for every pitch instead of one per lead
+        caller.generate_pitches(pending)
+
         bot.send_message(chat_id, "⚙️ Începem generarea site-urilor și apelurile...", parse_mode='Markdown')
 
         for i, lead in enumerate(leads):
+            if lead['state'] not in (FOUND, SITE_GENERATED):
+                # Already called (or the call may have gone out right before a crash) — never pay twice
+                continue
+            blocked = usage.campaign_blocked()
+            if blocked:
+                _queue_campaign(campaign_id, chat_id, blocked)
+                return
             try:
-                bot.send_message(chat_id, f"🛠️ [{i+1}/{len(leads)}] Construiesc site pentru **{lead['name']}**...", parse_mode='Markdown')
-                
-                # Use generate_and_save with lead data
-                biz_data = {
-                    "name": lead['name'],
-                    "category": lead['category'],
-                    "address": lead['address'],
-                    "phone": lead['phone'],
-                    "reviews": lead.get('reviews', []),
-                    "rating": lead.get('rating', 5),
-                    "reviews_count": lead.get('reviews_count', 0),
-                    "extra_info": "Campanie Automată Outreach (Beta)"
-                }
-                
-                site_id, filename = generate_and_save(biz_data)
+                if lead['state'] == FOUND:
+                    bot.send_message(chat_id, f"🛠️ [{i+1}/{len(leads)}] Construiesc site pentru **{lead['name']}**...", parse_mode='Markdown')
+                    
+                    # Use generate_and_save with lead data
+                    biz_data = {
+                        "name": lead['name'],
+                        "category": lead['category'],
+                        "address": lead['address'],
+                        "phone": lead['phone'],
+                        "reviews": lead.get('reviews', []),
+                        "rating": lead.get('rating', 5),
+                        "reviews_count": lead.get('reviews_count', 0),
+                        "extra_info": "Campanie Automată Outreach (Beta)"
+                    }
+                    
+                    site_id, filename, _ = generate_and_save(biz_data)
+                    campaign_store.mark_site_generated(lead['lead_id'], site_id, filename)
+                else:
+                    site_id, filename = lead['site_id'], lead['filename']
                 url = f"{PUBLIC_URL}/demos/{filename}"
                 
                 bot.send_message(chat_id, f"🌐 Site creat: [Vizualizează]({url})\n📞 Pregătesc apelul către: `{lead['phone']}`", parse_mode='Markdown')
                 
                 # Place the call
-                call_res = caller.place_call(lead['name'], lead['phone'], site_id)
+                campaign_store.mark_calling(lead['lead_id'])
+                with usage.tag(site_id=site_id):
+                    call_res = caller.place_call(lead['name'], lead['phone'], site_id, category=lead['category'])
                 
                 if call_res.get('status') == 'dry_run':
+                    campaign_store.mark_called(lead['lead_id'], 'dry_run')
                     bot.send_message(chat_id, f"⚠️ **DRY RUN:** Apelul către {lead['name']} a fost simulat (chei API lipsă).")
                 elif 'call_id' in call_res:
+                    campaign_store.mark_called(lead['lead_id'], 'active', call_id=call_res['call_id'])
                     bot.send_message(chat_id, f"📞 **APEL ACTIV!** AI-ul vorbește acum cu clientul. ID Apel: `{call_res['call_id']}`")
                 else:
+                    campaign_store.mark_called(lead['lead_id'], 'error')
                     bot.send_message(chat_id, f"❌ Eroare apel: {call_res.get('message', 'Eroare necunoscută')}")
                 
                 # Small delay between calls
@@ -253,11 +405,52 @@ def campaign_worker(chat_id, niche, loc):
             except Exception as e:
                 bot.send_message(chat_id, f"⚠️ Eroare la lead-ul {lead['name']}: {e}")
 
+        campaign_store.set_status(campaign_id, 'done')
         bot.send_message(chat_id, "🏁 **Campanie Finalizată!**\n\nToate lead-urile au fost procesate.")
 
     except Exception as e:
+        campaign_store.set_status(campaign_id, 'failed')
         bot.send_message(chat_id, f"🚨 **EROARE CRITICĂ CAMPANIE:** {e}")
 
+def resume_campaigns():
+    """Restarts campaigns interrupted by a crash or redeploy."""
+    for campaign in campaign_store.unfinished_campaigns():
+        print(f"♻️ Resuming campaign #{campaign['id']} ({campaign['niche']}, {campaign['location']})", flush=True)
+        bot.send_message(campaign['chat_id'], f"♻️ Reluăm campania #{campaign['id']} (**{campaign['niche']}**, {campaign['location']}) după repornire.", parse_mode='Markdown')
+        threading.Thread(target=campaign_worker, args=(campaign['id'],)).start()
+
+def _background_jobs():
+    # Several web workers may import the bot — only the one holding the lock runs the jobs
+    lock = open(os.path.join(BASE_DIR, '.bot_jobs.lock'), 'w')
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    resume_campaigns()
+    budget_watcher()
+
+def start_background_jobs():
+    """Resumes interrupted campaigns and starts the budget watcher, once per deployment."""
+    threading.Thread(target=_background_jobs, name="bot-jobs", daemon=True).start()
+
+def set_webhook():
+    """Points Telegram at the server's webhook route (run once per deploy, after the server is up)."""
+    url = f"{PUBLIC_URL}/telegram/webhook"
+    bot.set_webhook(url=url, secret_token=WEBHOOK_SECRET, max_connections=40)
+    print(f"🔗 Telegram webhook set to {url}", flush=True)
+
+def budget_watcher():
+    """Fills in Retell call minutes and resumes queued campaigns once the daily budget allows."""
+    while True:
+        time.sleep(BUDGET_CHECK_INTERVAL)
+        try:
+            usage.sync_retell_minutes()
+            if usage.campaign_blocked():
+                continue
+            for campaign in campaign_store.queued_campaigns():
+                print(f"▶️ Budget available again, resuming campaign #{campaign['id']}", flush=True)
+                bot.send_message(campaign['chat_id'], f"▶️ Bugetul zilnic permite din nou — reluăm campania #{campaign['id']}.")
+                threading.Thread(target=campaign_worker, args=(campaign['id'],)).start()
+        except Exception as e:
+            print(f"Budget Watcher Error: {e}", flush=True)
+
 def start_generation(message):
     chat_id = message.chat.id
     data = user_sessions.get(chat_id)
@@ -276,7 +469,8 @@ def start_generation(message):
     }
     
     try:
-        site_id, filename = generate_and_save(biz_data)
+        with usage.tag(channel="telegram"), profiler.tracked("bot:generate"):
+            site_id, filename, _ = generate_and_save(biz_data)
         url = f"{PUBLIC_URL}/demos/{filename}"
         
         # Save site_id for future /edit calls
@@ -293,6 +487,17 @@ def start_generation(message):
         bot.send_message(chat_id, f"Oops! A apărut o eroare la generare: {e}\n\nÎncearcă din nou folosind /start.")
 
 if __name__ == '__main__':
+    if not TOKEN:
+        print("WARNING: TELEGRAM_BOT_TOKEN not found. Bot disabled.")
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "webhook":
+        if not WEBHOOK_SECRET:
+            print("🚨 TELEGRAM_WEBHOOK_SECRET is required in webhook mode.", flush=True)
+            sys.exit(1)
+        set_webhook()
+        sys.exit(0)
+
     print(f"🚀 ShapeShift Bot is starting...", flush=True)
     print(f"👑 ADMIN_ID configured: {ADMIN_ID}", flush=True)
     print(f"🔗 PUBLIC_URL: {PUBLIC_URL}", flush=True)
@@ -302,6 +507,10 @@ if __name__ == '__main__':
     telebot_logger = logging.getLogger('TeleBot')
     telebot_logger.setLevel(logging.CRITICAL)
 
+    # A webhook left over from webhook mode makes getUpdates fail with 409
+    bot.remove_webhook()
+    start_background_jobs()
+
     # Robust polling loop to handle conflicts and restarts
     while True:
         try:
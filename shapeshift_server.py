@@ -1,15 +1,9 @@
 """
 ShapeShift API Server — Backend for the WEB? AI?? website generator UI.
 """
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, request, jsonify, send_from_directory, send_file, redirect, g, Response
 from flask_cors import CORS
-import os, re, uuid, json, sys, random
-
-# New SDK import
-try:
-    from google import genai
-except ImportError:
-    genai = None
+import os, re, uuid, json, sys, random, hmac, time
 
 from dotenv import load_dotenv
 
@@ -18,7 +12,108 @@ load_dotenv()
 app = Flask(__name__, static_folder='.')
 CORS(app)
 
-from core import increment_counter, generate_and_save, SITES_DIR, GEN_DIR, BASE_DIR, send_verification_code, verify_code, notify_admin_site_created
+from gemini import get_client, is_configured as gemini_configured
+from model_router import SCOREBOARD, deadline_in
+import site_pool
+import site_store
+import image_proxy
+import site_preview
+import search_index
+import usage
+import html_check
+import profiler
+import hot_pages
+from core import increment_counter, generate_and_save, STATS_DEFAULTS, SITES_DIR, GEN_DIR, BASE_DIR, send_verification_code, verify_code, notify_admin_site_created
+
+if gemini_configured():
+    site_pool.start_warmer()
+site_store.start_janitor()
+
+# Webhook mode: Telegram updates are served by this app instead of a polling bot process
+TELEGRAM_WEBHOOK = os.getenv("BOT_MODE") == "webhook" and bool(os.getenv("TELEGRAM_BOT_TOKEN"))
+if TELEGRAM_WEBHOOK:
+    import shapeshift_bot
+    shapeshift_bot.start_background_jobs()
+
+# Admin-only routes (/admin/*) answer 404 until ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def is_admin():
+    # Header only — a token in the query string would end up in access logs
+    token = request.headers.get("X-Admin-Token") or ""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.before_request
+def track_request():
+    # A profile run is slow by design — don't let it fill the slow-request ring
+    if not request.path.startswith('/admin/'):
+        g.profile_entry = profiler.begin(f"{request.method} {request.path}")
+
+@app.teardown_request
+def finish_request(error=None):
+    entry = g.pop("profile_entry", None)
+    if entry is not None:
+        profiler.end(entry, error=str(error) if error else None)
+
+# Published demos by host: <ID>.<SITES_DOMAIN> (wildcard DNS) or a custom domain mapped in /admin/domains
+SITES_DOMAIN = os.getenv("SITES_DOMAIN", "").lower().strip('.')
+DOMAINS_TTL = 30
+# Site IDs as generate_and_save makes them — any other subdomain is not a site
+HOST_SITE_ID_RE = re.compile(r'^[0-9a-f]{8}$')
+_domains = {"map": {}, "loaded": 0}
+
+def site_for_host(host):
+    host = (host or "").split(':')[0].lower().rstrip('.')
+    if SITES_DOMAIN and host.endswith('.' + SITES_DOMAIN):
+        label = host[:-len(SITES_DOMAIN) - 1]
+        return label.upper() if HOST_SITE_ID_RE.match(label) else None
+    # The mapping lives in the site store (shared by every node) — re-read it at most every DOMAINS_TTL
+    if time.monotonic() - _domains["loaded"] > DOMAINS_TTL:
+        try:
+            _domains["map"] = site_store.load_domains()
+        except Exception as e:
+            print(f"Domains Load Error: {e}", flush=True)
+        _domains["loaded"] = time.monotonic()
+    return _domains["map"].get(host)
+
+def serve_site(query):
+    """Response with a site's page, or None if there is no such site."""
+    if not hot_pages.ENABLED:
+        site_id = site_store.resolve(query)
+        path = site_store.html_path(site_id) if site_id else None
+        if path:
+            return send_file(path, mimetype='text/html')
+        # Archived demos are still readable from their pack
+        html = site_store.load_html(site_id) if site_id else None
+        return Response(html, mimetype='text/html') if html is not None else None
+
+    page = hot_pages.page(query)
+    if page is None:
+        return None
+    gzipped = bool(request.accept_encodings['gzip'])
+    # Each encoding is a different representation, so it gets its own ETag
+    etag = f"{page.revision}-gz" if gzipped else page.revision
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif gzipped:
+        # Compressed once when cached — sent as-is
+        response = Response(page.body, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(page.html(), mimetype='text/html')
+    response.set_etag(etag)
+    # Always revalidate: an edit must show up on the next load, a 304 keeps that cheap
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.before_request
+def route_by_host():
+    if request.path not in ('/', '/index.html'):
+        return None
+    site_id = site_for_host(request.host)
+    # Unknown hosts (and the app's own domain) fall through to the normal routes
+    return serve_site(site_id) if site_id else None
 
 # --- BAD WORDS FILTER ---
 BAD_WORDS = [
@@ -34,16 +129,6 @@ def contains_bad_words(text):
             return True
     return False
 
-# Configure Gemini via New SDK
-api_key = os.getenv("GEMINI_API_KEY")
-client = None
-if api_key and genai:
-    try:
-        client = genai.Client(api_key=api_key)
-        print("READY: ShapeShift Engine Loaded (New SDK)", flush=True)
-    except Exception as e:
-        print(f"ERROR: Gemini Init — {e}", flush=True)
-
 @app.route('/')
 def index():
     return send_from_directory('.', 'shapeshift.html')
@@ -54,38 +139,167 @@ def view_page():
 
 @app.route('/demos/<path:filename>')
 def serve_demo(filename):
-    # Security: only allow the exact basename — no directory traversal
+    # Security: the URL is only ever resolved to a site ID — no directory traversal
     clean_name = os.path.basename(filename)
-    # Use send_from_directory — handles Windows paths + special chars reliably
+    response = serve_site(clean_name)
+    if response is not None:
+        return response
+    print(f"serve_demo: '{clean_name}' not found", flush=True)
+    return f"<h1>404 – '{clean_name}' not found on server.</h1>", 404
+
+@app.route('/preview/<site_id>')
+def serve_preview(site_id):
+    """Script-free, lazy-image variant of a site for galleries."""
+    resolved = site_store.resolve(site_id)
+    path = site_preview.preview_path(resolved) if resolved else None
+    if not path:
+        return "Not found", 404
+    return send_file(path, mimetype='text/html', max_age=300)
+
+@app.route('/thumb/<site_id>')
+def serve_thumb(site_id):
+    resolved = site_store.resolve(site_id)
+    path, mimetype = site_preview.thumb_path(resolved) if resolved else (None, None)
+    if not path:
+        return "Not found", 404
+    return send_file(path, mimetype=mimetype, max_age=300)
+
+@app.route('/img/<int:width>x<int:height>/<keywords>/<int:lock>')
+def proxy_image(width, height, keywords, lock):
+    """loremflickr images, fetched once and served from the local cache (WebP / resized when possible)."""
+    webp = 'image/webp' in request.headers.get('Accept', '')
     try:
-        return send_from_directory(SITES_DIR, clean_name)
+        path, mimetype = image_proxy.get_variant(width, height, keywords, lock, target_width=request.args.get('w', type=int), webp=webp)
+    except ValueError:
+        return "Invalid image", 404
     except Exception as e:
-        print(f"serve_demo error for '{clean_name}': {e}", flush=True)
-        return f"<h1>404 – '{clean_name}' not found on server.</h1>", 404
+        print(f"proxy_image error for {keywords}/{lock}: {e}", flush=True)
+        return redirect(f"https://loremflickr.com/{width}/{height}/{keywords}/all?lock={lock}")
+
+    response = send_file(path, mimetype=mimetype, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept'
+    return response
 
 @app.route('/api/demos', methods=['GET'])
 def list_demos():
     """Returns a list of all demo sites in the folder."""
     try:
-        files = [f for f in os.listdir(SITES_DIR) if f.endswith('.html')]
-        # Optional: Parse some info from the filename or just return names
-        return jsonify({"demos": files})
+        sites = site_store.list_sites()
+        return jsonify({
+            "demos": [m["filename"] for m in sites],
+            "sites": [{
+                "id": m["id"], "filename": m["filename"], "biz_name": m.get("biz_name"),
+                "category": m.get("category"), "thumb": f"/thumb/{m['id']}", "preview": f"/preview/{m['id']}"
+            } for m in sites]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/search')
+def search_sites():
+    """Full-text search over generated sites, with category/city facets."""
+    # Results carry lead phone numbers — operator data, like /api/metrics
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        result = search_index.search(
+            request.args.get('q', ''),
+            category=request.args.get('category'),
+            city=request.args.get('city'),
+            limit=max(1, min(request.args.get('limit', 20, type=int), 50))
+        )
+        return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/stats')
 def get_stats():
-    stats_path = os.path.join(BASE_DIR, 'stats.json')
     try:
-        with open(stats_path, 'r') as f:
-            stats = json.load(f)
-        return jsonify(stats)
+        return jsonify(site_store.load_stats(STATS_DEFAULTS))
     except Exception:
         return jsonify({"sites_created": 149})
 
 @app.route('/api/health')
 def health():
-    return jsonify({"status": "ok", "path": SITES_DIR, "gemini_ready": client is not None})
+    return jsonify({"status": "ok", "path": SITES_DIR, "gemini_ready": gemini_configured()})
+
+@app.route('/api/metrics')
+def metrics():
+    # Model latencies, pool depth, storage bucket/prefix — operator data, not for the public
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"models": SCOREBOARD.snapshot(), "pool": site_pool.metrics(), "html": html_check.metrics(),
+                    "storage": site_store.storage_stats(), "hot_pages": hot_pages.metrics()})
+
+@app.route('/admin/profile', methods=['POST'])
+def admin_profile():
+    """Starts sampling this worker for ?seconds=N (max 60) in the background; the result is fetched from result_url."""
+    if not is_admin():
+        return jsonify({"error": "Not found"}), 404
+    seconds = min(request.args.get('seconds', 10, type=float), profiler.MAX_PROFILE_SECONDS)
+    try:
+        profile_id = profiler.start_profile(seconds)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"id": profile_id, "pid": os.getpid(), "seconds": seconds, "result_url": f"/admin/profile/{profile_id}"}), 202
+
+@app.route('/admin/profile/<profile_id>')
+def admin_profile_result(profile_id):
+    """Collapsed stacks for flamegraph.pl / speedscope once the profile is done (202 while it runs)."""
+    if not is_admin():
+        return jsonify({"error": "Not found"}), 404
+    status, stacks = profiler.profile_result(profile_id)
+    if status == "running":
+        return jsonify({"status": "running"}), 202
+    if status == "unknown":
+        return jsonify({"error": "Not found"}), 404
+    if status == "failed":
+        return jsonify({"status": "failed", "error": "The worker running this profile exited before it finished"}), 500
+    return Response(stacks, mimetype='text/plain', headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.txt"})
+
+@app.route('/admin/slow')
+def admin_slow():
+    if not is_admin():
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"pid": os.getpid(), "threshold_ms": profiler.SLOW_REQUEST_MS, "requests": profiler.slow_requests()})
+
+@app.route('/admin/domains', methods=['GET', 'POST'])
+def admin_domains():
+    """Lists custom domains, or maps one: POST {"host": "salon-ana.ro", "site_id": "AB12CD34"} (site_id null removes it)."""
+    if not is_admin():
+        return jsonify({"error": "Not found"}), 404
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        host = data.get('host')
+        if not host:
+            return jsonify({"error": "host required"}), 400
+        site_id = site_store.resolve(data['site_id']) if data.get('site_id') else None
+        if data.get('site_id') and not site_id:
+            return jsonify({"error": "Site not found"}), 404
+        _domains["map"] = site_store.set_domain(host, site_id)
+        _domains["loaded"] = time.monotonic()
+    else:
+        _domains["map"] = site_store.load_domains()
+    return jsonify({"sites_domain": SITES_DOMAIN or None, "domains": _domains["map"]})
+
+@app.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    if not TELEGRAM_WEBHOOK:
+        return jsonify({"error": "Not found"}), 404
+    secret = shapeshift_bot.WEBHOOK_SECRET or ""
+    if not secret or not hmac.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret):
+        return jsonify({"error": "Forbidden"}), 403
+
+    from telebot.types import Update
+    payload = request.get_json(silent=True, force=True)
+    # Telegram retries a 5xx forever — a body it can't parse gets a final 400 instead
+    if not isinstance(payload, dict) or "update_id" not in payload:
+        return jsonify({"error": "Invalid update"}), 400
+    update = Update.de_json(payload)
+    # Handlers run on the bot's worker pool — Telegram gets its 200 right away
+    shapeshift_bot.bot.process_new_updates([update])
+    return "", 200
 
 @app.route('/api/verify/request', methods=['POST'])
 def request_verification():
@@ -108,7 +322,7 @@ def check_verification():
 
 @app.route('/api/generate', methods=['POST'])
 def generate_site():
-    if not client:
+    if not get_client():
         return jsonify({"error": "Gemini not configured — check API key"}), 503
     
     try:
@@ -128,11 +342,9 @@ def generate_site():
             "reviews": [], "rating": 5, "reviews_count": 0
         }
         
-        site_id, filename = generate_and_save(biz_data)
-        
-        import os
-        with open(os.path.join(SITES_DIR, filename), 'r', encoding='utf-8') as f:
-            html = f.read()
+        # Whole request budget, propagated down to every model call
+        with usage.tag(channel="web"):
+            site_id, filename, html = generate_and_save(biz_data, deadline=deadline_in())
         
         # Notify Admin
         public_url = os.getenv("PUBLIC_URL", "http://localhost:5000")
@@ -140,7 +352,7 @@ def generate_site():
         notify_admin_site_created(biz_name, site_id, site_url)
         
         print(f"GENERATED: {filename}", flush=True)
-        return jsonify({"site_id": site_id, "filename": filename, "html": html})
+        return jsonify({"site_id": site_id, "filename": filename, "url": f"/demos/{filename}", "html": html})
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -153,22 +365,13 @@ def generate_site():
 
 @app.route('/api/site/<site_id>', methods=['GET'])
 def get_site(site_id):
-    # Try direct filename first
-    filename = site_id if site_id.endswith('.html') else f"{site_id}.html"
-    path = os.path.join(SITES_DIR, filename)
-    
-    if not os.path.exists(path):
-        # Scan dir for the site_id suffix
-        files = os.listdir(SITES_DIR)
-        match = next((f for f in files if site_id in f), None)
-        if match:
-            path = os.path.join(SITES_DIR, match)
-        else:
-            return jsonify({"error": "Not found"}), 404
-            
-    with open(path, 'r', encoding='utf-8') as f:
-        html = f.read()
-    return jsonify({"html": html, "site_id": site_id})
+    """Metadata + URL only — the page itself is streamed by /demos/ (sendfile), never JSON-escaped."""
+    resolved = site_store.resolve(site_id)
+    meta = site_store.load_meta(resolved) if resolved else None
+    if not meta:
+        return jsonify({"error": "Not found"}), 404
+
+    return jsonify({"site_id": resolved, "url": f"/demos/{meta['filename']}", "meta": meta})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
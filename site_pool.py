@@ -0,0 +1,178 @@
+"""
+Pool of pre-generated, niche-specific base sites.
+
+A background warmer keeps SITE_POOL_SIZE pages per popular niche on disk, generated
+with placeholder business fields. A matching request takes one page (atomic
+rename, so several gunicorn workers and the bot can share the pool), fills in
+the name, phone and address, and the warmer refills the slot asynchronously.
+Only one process runs the warmer (file lock); the others just take pages.
+"""
+import os
+import re
+import html as html_lib
+import time
+import uuid
+import fcntl
+import threading
+from urllib.parse import quote
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POOL_DIR = os.path.join(BASE_DIR, 'site_pool')
+
+POOL_SIZE = int(os.getenv("SITE_POOL_SIZE", "2"))
+REFILL_INTERVAL = int(os.getenv("SITE_POOL_INTERVAL", "60"))
+# Let the process finish booting before the warmer competes for CPU
+WARMUP_DELAY = 10
+
+# niche key -> (category sent to the model, keywords that map a request to the niche)
+NICHES = {
+    "service_auto": ("Service Auto", ["service auto", "auto", "mecanic", "vulcanizare", "tinichigerie"]),
+    "restaurant": ("Restaurant", ["restaurant", "pizzerie", "pizza", "bistro", "trattoria", "fast food"]),
+    "salon": ("Salon de Înfrumusețare", ["salon", "coafor", "frizerie", "barber", "beauty", "manichiura", "cosmetica"]),
+    "stomatologie": ("Cabinet Stomatologic", ["stomatolog", "dentist", "dentar", "clinica dentara", "ortodont"]),
+}
+ENABLED_NICHES = [n.strip() for n in os.getenv("SITE_POOL_NICHES", ",".join(NICHES)).split(',') if n.strip() in NICHES]
+
+# Placeholders the pooled pages are generated with
+NAME_TOKEN = "Firma Demo SRL"
+PHONE_TOKEN = "0700000000"
+ADDRESS_TOKEN = "Strada Exemplu nr. 1"
+
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+_stats_lock = threading.Lock()
+_refill_now = threading.Event()
+_warmer = None
+
+def niche_for(category):
+    """Maps a free-text category to a pooled niche key, or None."""
+    text = (category or "").lower()
+    text = text.translate(str.maketrans("ăâîșşțţ", "aaisstt"))
+    for key in ENABLED_NICHES:
+        if any(re.search(r'\b' + re.escape(word), text) for word in NICHES[key][1]):
+            return key
+    return None
+
+def is_poolable(biz_data):
+    """Only generic requests can be served from the pool — real reviews, logos and client notes need a fresh page."""
+    return POOL_SIZE > 0 and not (biz_data.get("reviews") or biz_data.get("logo_base64") or biz_data.get("extra_info"))
+
+def _niche_dir(key):
+    path = os.path.join(POOL_DIR, key)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def depth(key):
+    try:
+        return len([f for f in os.listdir(_niche_dir(key)) if f.endswith('.html')])
+    except OSError:
+        return 0
+
+def _fill(html, biz_data):
+    # User text goes into markup (text and attributes) — escape it
+    phone = biz_data.get("phone") or ""
+    tel = re.sub(r'[^\d+]', '', phone)
+    html = html.replace(f"tel:{PHONE_TOKEN}", f"tel:{quote(tel, safe='+')}" if tel else "#contact")
+    html = html.replace(PHONE_TOKEN, html_lib.escape(phone or "Contact rapid"))
+    html = html.replace(ADDRESS_TOKEN, html_lib.escape(biz_data.get("address") or "România"))
+    return html.replace(NAME_TOKEN, html_lib.escape(biz_data["name"]))
+
+def take(biz_data):
+    """Returns a filled pooled page for the request, or None on a miss."""
+    key = niche_for(biz_data.get("category"))
+    if not key or not is_poolable(biz_data):
+        return None
+
+    niche_dir = _niche_dir(key)
+    for name in sorted(os.listdir(niche_dir)):
+        if not name.endswith('.html'):
+            continue
+        claimed = os.path.join(niche_dir, f"{name}.{uuid.uuid4().hex}.claimed")
+        try:
+            # Atomic claim: only one process wins each pooled page
+            os.rename(os.path.join(niche_dir, name), claimed)
+        except OSError:
+            continue
+        with open(claimed, 'r', encoding='utf-8') as f:
+            html = f.read()
+        os.remove(claimed)
+        with _stats_lock:
+            _stats[key]["hits"] += 1
+        _refill_now.set()
+        return _fill(html, biz_data)
+
+    with _stats_lock:
+        _stats[key]["misses"] += 1
+    _refill_now.set()
+    return None
+
+def _generate_one(key):
+    import usage
+    from web_generator import WebGenerator
+    generator = WebGenerator()
+    if not generator.client:
+        return False
+    biz_data = {
+        "name": NAME_TOKEN, "category": NICHES[key][0],
+        "address": ADDRESS_TOKEN, "phone": PHONE_TOKEN,
+        "reviews": [], "rating": 5, "reviews_count": 0
+    }
+    with usage.tag(channel="warmer"):
+        html = generator._generate_ai_html(biz_data)
+    # The stub page on failure has no tel: link, and a page that renamed the business can't be filled — never pool those
+    if f"tel:{PHONE_TOKEN}" not in html or NAME_TOKEN not in html:
+        return False
+    # Build the CSS now so a pool hit costs nothing at request time
+    import css_build
+    html = css_build.inline_css(html)
+    tmp_path = os.path.join(_niche_dir(key), f"{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(tmp_path, tmp_path[:-4] + '.html')
+    return True
+
+def refill():
+    """Tops up every enabled niche to POOL_SIZE pages."""
+    import usage
+    # Warming is optional spend — stop for the day rather than fill the pool from the cheap chain
+    if usage.over_token_budget("warmer"):
+        return
+    for key in ENABLED_NICHES:
+        while depth(key) < POOL_SIZE:
+            try:
+                if not _generate_one(key):
+                    break
+                print(f"🔥 [POOL] {key}: {depth(key)}/{POOL_SIZE}", flush=True)
+            except Exception as e:
+                print(f"[POOL] Refill error for {key}: {e}", flush=True)
+                break
+
+def _warm_loop():
+    time.sleep(WARMUP_DELAY)
+    # Every gunicorn worker starts a warmer — only the one holding the lock generates (waiting ones take over if it dies)
+    os.makedirs(POOL_DIR, exist_ok=True)
+    lock = open(os.path.join(POOL_DIR, '.warmer.lock'), 'w')
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    while True:
+        refill()
+        _refill_now.wait(REFILL_INTERVAL)
+        _refill_now.clear()
+
+def start_warmer():
+    """Starts the background warmer once per process (no-op when the pool is disabled)."""
+    global _warmer
+    if POOL_SIZE <= 0 or (_warmer and _warmer.is_alive()):
+        return
+    _warmer = threading.Thread(target=_warm_loop, name="site-pool-warmer", daemon=True)
+    _warmer.start()
+
+def metrics():
+    result = {}
+    with _stats_lock:
+        for key in ENABLED_NICHES:
+            hits, misses = _stats[key]["hits"], _stats[key]["misses"]
+            result[key] = {
+                "depth": depth(key), "hits": hits, "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None
+            }
+    return result
@@ -0,0 +1,123 @@
+"""
+Lightweight gallery assets for every site, stored next to it in its shard:
+
+    <ID>.preview.html   the page without scripts, animations or eager images
+    <ID>.thumb.webp     hero image + business name, ~20 KB (needs Pillow and the image proxy)
+    <ID>.thumb.svg      fallback card in the page's own colors
+
+Assets are rebuilt only when the page content changes (meta["preview_hash"]).
+"""
+import re
+import html as html_lib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import site_store
+import css_build
+import image_proxy
+
+THUMB_SIZE = (640, 400)
+
+SCRIPT_RE = re.compile(r'<script\b[^>]*>.*?</script>\s*', re.IGNORECASE | re.DOTALL)
+AOS_LINK_RE = re.compile(r'<link\b[^>]*aos[^>]*>\s*', re.IGNORECASE)
+AOS_ATTR_RE = re.compile(r'\sdata-aos[\w\-]*="[^"]*"', re.IGNORECASE)
+HANDLER_ATTR_RE = re.compile(r'\son[a-z]+\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s>]+)', re.IGNORECASE)
+IMG_TAG_RE = re.compile(r'<img\b(?![^>]*\bloading=)', re.IGNORECASE)
+HERO_IMG_RE = re.compile(r'/img/(\d+)x(\d+)/([a-z0-9,_\-]+)/(\d+)')
+HEX_COLOR_RE = re.compile(r'#[0-9a-fA-F]{6}\b')
+
+_thumb_pool = ThreadPoolExecutor(max_workers=2)
+
+def build_preview_html(page):
+    """The page minus everything a static preview doesn't need."""
+    # If the CSS was not compiled for this page, the Tailwind runtime is the only way it gets styled
+    keep_tailwind = bool(css_build.CDN_SCRIPT_RE.search(page))
+
+    def strip(match):
+        script = match.group(0)
+        if keep_tailwind and (css_build.CDN_SCRIPT_RE.match(script) or "tailwind.config" in script):
+            return script
+        return ""
+
+    preview = SCRIPT_RE.sub(strip, page)
+    preview = AOS_LINK_RE.sub("", preview)
+    preview = AOS_ATTR_RE.sub("", preview)
+    preview = HANDLER_ATTR_RE.sub("", preview)
+    preview = IMG_TAG_RE.sub('<img loading="lazy" decoding="async"', preview)
+    return re.sub(r'<head([^>]*)>', r'<head\1><meta name="robots" content="noindex">', preview, count=1, flags=re.IGNORECASE)
+
+def _svg_thumb(page, biz_name):
+    colors = HEX_COLOR_RE.findall(page) or ["#0f172a"]
+    start, end = colors[0], colors[1] if len(colors) > 1 else "#1e293b"
+    width, height = THUMB_SIZE
+    name = html_lib.escape(biz_name or "")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        f'<defs><linearGradient id="g" x1="0" y1="0" x2="1" y2="1"><stop offset="0" stop-color="{start}"/>'
+        f'<stop offset="1" stop-color="{end}"/></linearGradient></defs>'
+        f'<rect width="100%" height="100%" fill="url(#g)"/>'
+        f'<text x="32" y="{height - 40}" font-family="system-ui,sans-serif" font-size="36" font-weight="700" fill="#fff">{name}</text>'
+        f'</svg>'
+    )
+
+def _raster_thumb(page, biz_name):
+    """WebP bytes built from the page's hero image, or None."""
+    Image = image_proxy.load_pil()
+    hero = HERO_IMG_RE.search(page)
+    if Image is None or not hero:
+        return None
+    import io
+    from PIL import ImageDraw, ImageEnhance, ImageFont, ImageOps
+    width, height, keywords, lock = int(hero.group(1)), int(hero.group(2)), hero.group(3), int(hero.group(4))
+    with Image.open(image_proxy.fetch_original(width, height, keywords, lock)) as img:
+        thumb = ImageOps.fit(img.convert("RGB"), THUMB_SIZE, Image.LANCZOS)
+    thumb = ImageEnhance.Brightness(thumb).enhance(0.6)
+    try:
+        ImageDraw.Draw(thumb).text((32, THUMB_SIZE[1] - 72), biz_name or "", fill="white", font=ImageFont.load_default(size=36))
+    except TypeError:
+        # Pillow < 10.1 has no sized default font — the image alone still works
+        pass
+    buf = io.BytesIO()
+    thumb.save(buf, "WEBP", quality=70)
+    return buf.getvalue()
+
+def _build_raster(site_id, page, biz_name):
+    try:
+        data = _raster_thumb(page, biz_name)
+        if data:
+            site_store.save_asset(site_id, "thumb.webp", data)
+    except Exception as e:
+        print(f"[PREVIEW] Thumbnail failed for {site_id}: {e}", flush=True)
+
+def refresh(site_id, page=None, force=False):
+    """(Re)builds the preview assets of a site if its content changed since the last build."""
+    # Archived sites have no live shard entry to attach assets to
+    if not site_store.html_path(site_id):
+        return
+    meta = site_store.load_meta(site_id)
+    page = page if page is not None else site_store.load_html(site_id)
+    digest = hashlib.sha1(page.encode()).hexdigest()[:12]
+    if not force and meta.get("preview_hash") == digest and site_store.asset_path(site_id, "preview.html"):
+        return
+
+    site_store.save_asset(site_id, "preview.html", build_preview_html(page))
+    site_store.save_asset(site_id, "thumb.svg", _svg_thumb(page, meta.get("biz_name")))
+    site_store.delete_asset(site_id, "thumb.webp")
+    site_store.update_meta(site_id, preview_hash=digest)
+    # The raster thumbnail needs the hero image — fetch it off the request path
+    _thumb_pool.submit(_build_raster, site_id, page, meta.get("biz_name"))
+
+def preview_path(site_id):
+    if not site_store.asset_path(site_id, "preview.html"):
+        refresh(site_id)
+    return site_store.asset_path(site_id, "preview.html")
+
+def thumb_path(site_id):
+    """(path, mimetype) of the best thumbnail available, or (None, None)."""
+    for name, mimetype in (("thumb.webp", "image/webp"), ("thumb.svg", "image/svg+xml")):
+        path = site_store.asset_path(site_id, name)
+        if path:
+            return path, mimetype
+    refresh(site_id)
+    path = site_store.asset_path(site_id, "thumb.svg")
+    return (path, "image/svg+xml") if path else (None, None)
@@ -0,0 +1,580 @@
+"""
+Storage layout for generated sites.
+
+Every site is stored as <shard>/<ID>.html with its metadata in <ID>.json,
+where <shard> is the first two hex chars of sha1(ID). The public
+"<name>_<ID>.html" filename is only a URL — it is resolved back to the ID.
+
+Objects live in a pluggable backend: demos/ on local disk (default), or an
+S3-compatible bucket shared by several server nodes (SITE_STORAGE=s3,
+SITE_S3_BUCKET, SITE_S3_PREFIX, S3_ENDPOINT_URL; needs boto3). With S3 each
+node keeps a read-through disk cache in site_cache/ so hot pages are still
+served with sendfile.
+
+A background janitor moves unclaimed demos older than SITE_RETENTION_DAYS into
+zip packs under _archive/ (one new pack per run), which load_html() still reads.
+
+Counters are kept per node (stats/<node>.json, written under a local file lock)
+and summed on read, so nodes sharing a bucket never overwrite each other.
+
+    python site_store.py migrate     # move flat demos/ + generated_sites/ files into the sharded layout
+    python site_store.py janitor     # run one retention pass now
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import fcntl
+import socket
+import hashlib
+import zipfile
+import threading
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SITES_DIR = os.path.join(BASE_DIR, 'demos')
+LEGACY_DIRS = [SITES_DIR, os.path.join(BASE_DIR, 'generated_sites')]
+LEGACY_STATS_FILE = os.path.join(BASE_DIR, 'stats.json')
+ARCHIVE_DIR = os.path.join(SITES_DIR, '_archive')
+ARCHIVE_INDEX = "_archive/index.json"
+# Baseline counters (read-only since per-node counters) + one object per node
+STATS_KEY = "stats.json"
+STATS_PREFIX = "stats/"
+NODE_ID = re.sub(r'[^\w.-]', '_', os.getenv("SITE_NODE_ID") or socket.gethostname())
+STATS_LOCK_FILE = os.path.join(BASE_DIR, '.stats.lock')
+# Custom domain -> site ID, for host-routed demos
+DOMAINS_KEY = "domains.json"
+
+# local: everything under demos/ | s3: an S3-compatible bucket shared by every server node
+STORAGE = os.getenv("SITE_STORAGE", "local")
+# Per-node read-through cache of S3 objects (served with sendfile), revalidated after CACHE_TTL seconds
+CACHE_DIR = os.getenv("SITE_CACHE_DIR", os.path.join(BASE_DIR, 'site_cache'))
+CACHE_TTL = float(os.getenv("SITE_CACHE_TTL", "30"))
+
+RETENTION_DAYS = int(os.getenv("SITE_RETENTION_DAYS", "30"))
+JANITOR_INTERVAL = int(os.getenv("SITE_JANITOR_INTERVAL", str(6 * 3600)))
+
+SITE_KEY_RE = re.compile(r'^[0-9a-f]{2}/([^/.]+)\.json$')
+
+_index_lock = threading.Lock()
+_backend_lock = threading.Lock()
+_backend = None
+_janitor = None
+
+# --- Backends --------------------------------------------------------------
+# An object store of '/'-separated keys. version() changes whenever an object is rewritten.
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class LocalBackend:
+    """Objects are plain files under `root` (single node)."""
+    def __init__(self, root=SITES_DIR):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        _write_atomic(self._path(key), data)
+        return self.version(key)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def version(self, key):
+        try:
+            return str(os.stat(self._path(key)).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def keys(self, prefix=""):
+        # Only the directory the prefix points into is walked
+        top = self._path(prefix.rsplit('/', 1)[0]) if '/' in prefix else self.root
+        for root, _, names in os.walk(top):
+            rel = os.path.relpath(root, self.root).replace(os.sep, '/')
+            for name in names:
+                key = name if rel == '.' else f"{rel}/{name}"
+                if key.startswith(prefix) and not name.endswith(('.tmp', '.lock')):
+                    yield key
+
+    def local_path(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+    def stats(self):
+        return {"backend": "local", "root": self.root}
+
+class S3Backend:
+    """Objects in an S3-compatible bucket (AWS, MinIO, R2...). Needs boto3, or any client with the same methods."""
+    def __init__(self, bucket, prefix="", endpoint_url=None, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("SITE_STORAGE=s3 needs boto3 (pip install boto3)")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    @staticmethod
+    def _missing(error):
+        return getattr(error, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound")
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except Exception as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def put(self, key, data):
+        return self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data).get("ETag")
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def version(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key).get("ETag")
+        except Exception as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def exists(self, key):
+        return self.version(key) is not None
+
+    def keys(self, prefix=""):
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):]
+
+    def local_path(self, key):
+        return None
+
+    def stats(self):
+        return {"backend": "s3", "bucket": self.bucket, "prefix": self.prefix}
+
+class CachedBackend:
+    """Read-through, write-through disk cache in front of a remote backend, so hot pages are sendfile'd locally."""
+    def __init__(self, inner, cache_dir=CACHE_DIR, ttl=CACHE_TTL):
+        self.inner = inner
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # key -> (version, monotonic time it was last confirmed)
+        self.versions = {}
+        self.counters = {"hits": 0, "misses": 0, "revalidations": 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, *key.split('/'))
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def local_path(self, key):
+        path = self._path(key)
+        with self.lock:
+            known = self.versions.get(key)
+        if known and os.path.exists(path):
+            if time.monotonic() - known[1] < self.ttl:
+                self._count("hits")
+                return path
+            # Another node may have rewritten it — one HEAD instead of a download
+            self._count("revalidations")
+            version = self.inner.version(key)
+            if version == known[0]:
+                with self.lock:
+                    self.versions[key] = (version, time.monotonic())
+                return path
+
+        self._count("misses")
+        version = self.inner.version(key)
+        data = self.inner.get(key) if version else None
+        if data is None:
+            self._forget(key)
+            return None
+        _write_atomic(path, data)
+        with self.lock:
+            self.versions[key] = (version, time.monotonic())
+        return path
+
+    def _forget(self, key):
+        with self.lock:
+            self.versions.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        path = self.local_path(key)
+        if not path:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put(self, key, data):
+        version = self.inner.put(key, data)
+        _write_atomic(self._path(key), data)
+        with self.lock:
+            self.versions[key] = (version, time.monotonic())
+        return version
+
+    def delete(self, key):
+        self.inner.delete(key)
+        self._forget(key)
+
+    def exists(self, key):
+        return self.local_path(key) is not None
+
+    def version(self, key):
+        return self.inner.version(key)
+
+    def keys(self, prefix=""):
+        return self.inner.keys(prefix)
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            cached = len(self.versions)
+        return {**self.inner.stats(), "cache": {**counters, "entries": cached, "ttl": self.ttl}}
+
+def backend():
+    """The configured backend (SITE_STORAGE), created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STORAGE == "s3":
+                _backend = CachedBackend(S3Backend(
+                    os.getenv("SITE_S3_BUCKET", "webdone-sites"), os.getenv("SITE_S3_PREFIX", ""),
+                    endpoint_url=os.getenv("S3_ENDPOINT_URL")
+                ))
+            else:
+                _backend = LocalBackend()
+        return _backend
+
+def set_backend(new_backend):
+    """Swaps the backend (tests, fake_s3.py)."""
+    global _backend
+    with _backend_lock:
+        _backend = new_backend
+
+def storage_stats():
+    return backend().stats()
+
+# --- Sites -----------------------------------------------------------------
+
+def shard(site_id):
+    return hashlib.sha1(site_id.encode()).hexdigest()[:2]
+
+def _keys(site_id):
+    prefix = f"{shard(site_id)}/{site_id}"
+    return f"{prefix}.html", f"{prefix}.json"
+
+def _read_json(key):
+    data = backend().get(key)
+    return json.loads(data) if data else None
+
+def _write_json(key, value):
+    backend().put(key, json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+def public_filename(biz_name, site_id):
+    clean_biz = re.sub(r'[^a-zA-Z0-9]', '_', biz_name or 'site').lower()
+    return f"{clean_biz}_{site_id}.html"
+
+def revision(html):
+    """Short content hash of a page — changes on every edit (ETag / hot-page cache key)."""
+    return hashlib.sha1(html.encode('utf-8')).hexdigest()[:12]
+
+def save_site(site_id, html, meta):
+    """Stores a new site. `meta` gets 'id', 'filename' and 'created' filled in if missing, and the page 'revision'."""
+    meta = dict(meta)
+    meta["revision"] = revision(html)
+    meta.setdefault("id", site_id)
+    meta.setdefault("filename", public_filename(meta.get("biz_name"), site_id))
+    meta.setdefault("created", datetime.now().isoformat())
+    html_key, meta_key = _keys(site_id)
+    backend().put(html_key, html.encode('utf-8'))
+    _write_json(meta_key, meta)
+    return meta
+
+def save_html(site_id, html):
+    """Replaces the page of an existing (live) site. Returns the new revision."""
+    backend().put(_keys(site_id)[0], html.encode('utf-8'))
+    rev = revision(html)
+    update_meta(site_id, revision=rev)
+    return rev
+
+def update_meta(site_id, **fields):
+    meta = load_meta(site_id)
+    if meta is None:
+        return None
+    meta.update(fields)
+    _write_json(_keys(site_id)[1], meta)
+    return meta
+
+def _asset_key(site_id, name):
+    return f"{shard(site_id)}/{site_id}.{name}"
+
+def asset_path(site_id, name):
+    """Local path of a derived file stored next to the site ('<ID>.<name>'), or None if it doesn't exist."""
+    return backend().local_path(_asset_key(site_id, name))
+
+def save_asset(site_id, name, data):
+    backend().put(_asset_key(site_id, name), data if isinstance(data, bytes) else data.encode('utf-8'))
+
+def delete_asset(site_id, name):
+    backend().delete(_asset_key(site_id, name))
+
+def html_path(site_id):
+    """Local path of a live site's page (for sendfile), or None if missing or archived."""
+    return backend().local_path(_keys(site_id)[0])
+
+def _archive_index():
+    try:
+        return _read_json(ARCHIVE_INDEX) or {}
+    except ValueError:
+        return {}
+
+def _read_archived(site_id, suffix):
+    pack = _archive_index().get(site_id)
+    path = backend().local_path(f"_archive/{pack}") if pack else None
+    if not path:
+        return None
+    try:
+        with zipfile.ZipFile(path) as z:
+            return z.read(f"{site_id}{suffix}").decode('utf-8')
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+def load_html(site_id):
+    data = backend().get(_keys(site_id)[0])
+    if data is not None:
+        return data.decode('utf-8')
+    return _read_archived(site_id, '.html')
+
+def load_meta(site_id):
+    meta = _read_json(_keys(site_id)[1])
+    if meta is not None:
+        return meta
+    archived = _read_archived(site_id, '.json')
+    return json.loads(archived) if archived else None
+
+def iter_site_ids():
+    """IDs of all live (non-archived) sites."""
+    for key in backend().keys():
+        match = SITE_KEY_RE.match(key)
+        if match:
+            yield match.group(1)
+
+def list_sites():
+    """Metadata of all live sites, newest first."""
+    metas = [m for m in (load_meta(i) for i in iter_site_ids()) if m]
+    return sorted(metas, key=lambda m: m.get("created", ""), reverse=True)
+
+def site_id_from(query):
+    """'<name>_<ID>.html', '<ID>.html' or '<ID>' -> '<ID>' (not checked for existence)."""
+    stem = os.path.basename(query or '')
+    if stem.endswith('.html'):
+        stem = stem[:-5]
+    return stem.rsplit('_', 1)[-1].upper()
+
+def resolve(query):
+    """Resolves a filename ('<name>_<ID>.html', legacy ones included) or an exact ID to an existing site ID, or None."""
+    site_id = site_id_from(query)
+    if not site_id:
+        return None
+    # Exact lookups only (meta key, then the archive index) — never a scan, so a miss costs the same as a hit
+    if backend().exists(_keys(site_id)[1]) or site_id in _archive_index():
+        return site_id
+    return None
+
+# --- Stats -----------------------------------------------------------------
+
+def load_stats(defaults=None):
+    """Site counters: the baseline (stats.json, else the pre-backend file, else `defaults`) plus every node's counters."""
+    stats = _read_json(STATS_KEY)
+    if stats is None and os.path.exists(LEGACY_STATS_FILE):
+        with open(LEGACY_STATS_FILE, 'r') as f:
+            stats = json.load(f)
+    stats = dict(stats or defaults or {})
+    for key in backend().keys(STATS_PREFIX):
+        for name, value in (_read_json(key) or {}).items():
+            stats[name] = stats.get(name, 0) + value
+    return stats or None
+
+def increment_stat(name, by=1):
+    """Adds to this node's counter. Only this node's processes write its object, serialized by a local lock."""
+    key = f"{STATS_PREFIX}{NODE_ID}.json"
+    with open(STATS_LOCK_FILE, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        counters = _read_json(key) or {}
+        counters[name] = counters.get(name, 0) + by
+        _write_json(key, counters)
+
+# --- Custom domains --------------------------------------------------------
+
+def load_domains():
+    return _read_json(DOMAINS_KEY) or {}
+
+def set_domain(host, site_id):
+    """Maps a custom domain to a site (site_id=None removes it). Returns the whole mapping."""
+    domains = load_domains()
+    host = host.lower().strip().rstrip('.')
+    if site_id:
+        domains[host] = site_id
+    else:
+        domains.pop(host, None)
+    _write_json(DOMAINS_KEY, domains)
+    return domains
+
+# --- Migration -------------------------------------------------------------
+
+def _legacy_meta(path, site_id, filename):
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(4096)
+    stem = filename[:-5]
+    biz_name = stem.rsplit('_', 1)[0].replace('_', ' ').strip().title() if '_' in stem else None
+    title = re.search(r'<title>(.*?)</title>', head, re.IGNORECASE | re.DOTALL)
+    if title:
+        biz_name = re.split(r'\s+[|\-–—]\s+', title.group(1).strip())[0] or biz_name
+    return {
+        "id": site_id, "biz_name": biz_name or site_id, "filename": filename,
+        "created": datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+    }
+
+def migrate():
+    """Moves flat '<ID>.html' / '<name>_<ID>.html' files (+ sidecar .json) into the sharded layout."""
+    moved = 0
+    for legacy_dir in LEGACY_DIRS:
+        if not os.path.isdir(legacy_dir):
+            continue
+        for filename in sorted(os.listdir(legacy_dir)):
+            path = os.path.join(legacy_dir, filename)
+            if not filename.endswith('.html') or not os.path.isfile(path):
+                continue
+            site_id = site_id_from(filename)
+            sidecar = path[:-5] + '.json'
+            if not backend().exists(_keys(site_id)[1]):
+                if os.path.exists(sidecar):
+                    with open(sidecar, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    # Sidecars of '<ID>.html' sites don't know their public filename
+                    if filename != f"{site_id}.html":
+                        meta.setdefault("filename", filename)
+                else:
+                    meta = _legacy_meta(path, site_id, filename)
+                with open(path, 'r', encoding='utf-8') as f:
+                    save_site(site_id, f.read(), meta)
+                moved += 1
+            # generated_sites/ only ever held duplicates of demos/
+            os.remove(path)
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+    print(f"📦 [STORE] Migrated {moved} sites into {SITES_DIR}", flush=True)
+    return moved
+
+# --- Janitor ---------------------------------------------------------------
+
+def archive_sites(site_ids):
+    """Moves live sites into a new zip pack; they stay readable through load_html/load_meta."""
+    if not site_ids:
+        return
+    store = backend()
+    # Object stores can't append: every batch gets its own pack instead of rewriting an existing one
+    pack = f"{datetime.now().strftime('%Y-%m-%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.zip"
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        for site_id in site_ids:
+            for key in _keys(site_id):
+                z.writestr(key.split('/', 1)[1], store.get(key) or b"")
+    store.put(f"_archive/{pack}", buf.getvalue())
+    with _index_lock:
+        index = _archive_index()
+        index.update({site_id: pack for site_id in site_ids})
+        _write_json(ARCHIVE_INDEX, index)
+    # Derived assets (previews, thumbnails) are rebuilt on demand — no need to pack them
+    for site_id in site_ids:
+        for key in list(store.keys(f"{shard(site_id)}/{site_id}.")):
+            store.delete(key)
+
+def archive_site(site_id):
+    archive_sites([site_id])
+
+def run_janitor(retention_days=RETENTION_DAYS):
+    """Archives unclaimed sites older than `retention_days`. Returns how many were archived."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+    # One janitor at a time across gunicorn workers and the bot (run it on one node with SITE_STORAGE=s3)
+    with open(os.path.join(ARCHIVE_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        expired = []
+        for site_id in list(iter_site_ids()):
+            meta = load_meta(site_id)
+            if meta and not meta.get("claimed") and meta.get("created", "") < cutoff:
+                expired.append(site_id)
+        try:
+            archive_sites(expired)
+        except OSError as e:
+            print(f"[JANITOR] Could not archive {len(expired)} demos: {e}", flush=True)
+            expired = []
+    if expired:
+        # Archived demos are no longer listed — take them out of search too
+        import search_index
+        for site_id in expired:
+            try:
+                search_index.remove_site(site_id)
+            except Exception as e:
+                print(f"[JANITOR] Search index removal failed for {site_id}: {e}", flush=True)
+        print(f"🧹 [JANITOR] Archived {len(expired)} demos older than {retention_days} days", flush=True)
+    return len(expired)
+
+def _janitor_loop():
+    while True:
+        time.sleep(JANITOR_INTERVAL)
+        try:
+            run_janitor()
+        except Exception as e:
+            print(f"[JANITOR] Error: {e}", flush=True)
+
+def start_janitor():
+    """Starts the retention janitor once per process (disabled with SITE_RETENTION_DAYS=0)."""
+    global _janitor
+    if RETENTION_DAYS <= 0 or (_janitor and _janitor.is_alive()):
+        return
+    _janitor = threading.Thread(target=_janitor_loop, name="site-janitor", daemon=True)
+    _janitor.start()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "migrate":
+        migrate()
+    elif command == "janitor":
+        run_janitor()
+    else:
+        print(__doc__)
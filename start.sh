@@ -1,9 +1,45 @@
 #!/bin/bash
+# Move any flat demos/ files into the sharded layout (no-op once migrated)
+python3 site_store.py migrate
+# Build the search index once for sites created before it existed
+[ -f search.db ] || python3 search_index.py rebuild
+
+# Static CSS (css_build.py) needs the Tailwind v3 standalone CLI, provisioned with the image
+# (TAILWIND_BIN or tailwindcss on PATH) — never downloaded at boot. Without it pages keep the Play CDN.
+if [ -z "$TAILWIND_BIN" ] && ! command -v tailwindcss >/dev/null; then
+    echo "⚠️ Tailwind CLI not provisioned (set TAILWIND_BIN) — pages will use the CDN" >&2
+fi
+
+if [ "$BOT_MODE" = "webhook" ]; then
+    # Chat sessions live in memory: one worker, with threads so a long generation never blocks updates
+    GUNICORN_OPTS="--workers 1 --threads ${WEB_THREADS:-8}"
+fi
+
 # Start the Flask Server in the background
-gunicorn shapeshift_server:app --bind 0.0.0.0:$PORT --timeout 120 &
+gunicorn shapeshift_server:app --bind 0.0.0.0:$PORT --timeout 120 $GUNICORN_OPTS &
+SERVER_PID=$!
 
-# Wait a second for gunicorn
-sleep 2
+# Wait until gunicorn actually answers instead of guessing with a fixed sleep
+READY_TIMEOUT=${READY_TIMEOUT:-30}
+for i in $(seq 1 $((READY_TIMEOUT * 10))); do
+    curl -sf --max-time 1 "http://127.0.0.1:$PORT/api/health" >/dev/null && break
+    if ! kill -0 $SERVER_PID 2>/dev/null; then
+        echo "❌ gunicorn exited before becoming ready" >&2
+        exit 1
+    fi
+    sleep 0.1
+done
+if ! curl -sf --max-time 1 "http://127.0.0.1:$PORT/api/health" >/dev/null; then
+    echo "❌ Server not ready after ${READY_TIMEOUT}s" >&2
+    kill $SERVER_PID 2>/dev/null
+    exit 1
+fi
 
-# Start the Telegram Bot
-python3 shapeshift_bot.py
+if [ "$BOT_MODE" = "webhook" ]; then
+    # Updates now arrive on /telegram/webhook — no second process
+    python3 shapeshift_bot.py webhook
+    wait
+else
+    # Start the Telegram Bot
+    python3 shapeshift_bot.py
+fi
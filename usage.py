@@ -0,0 +1,218 @@
+"""
+Usage ledger for paid APIs: Gemini tokens, SerpApi requests and Retell call minutes.
+
+Every record is tagged with the channel it was spent for (web, telegram,
+campaign, warmer) and the site_id when known. Tags are thread-local:
+
+    with usage.tag(channel="web"):
+        ...  # every Gemini call made below is billed to "web"
+
+Daily budgets per channel (BUDGET_WEB_TOKENS, BUDGET_TELEGRAM_TOKENS,
+BUDGET_CAMPAIGN_TOKENS, BUDGET_WARMER_TOKENS, BUDGET_SERPAPI_REQUESTS,
+BUDGET_RETELL_MINUTES; unset or 0 = unlimited) are checked by the callers:
+generation degrades to the cheap model chain, campaigns are queued until the
+next day, the site pool warmer pauses.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USAGE_DB = os.getenv("USAGE_DB", os.path.join(BASE_DIR, 'usage.db'))
+
+CHANNELS = ("web", "telegram", "campaign", "warmer")
+# Retell calls still without minutes after this long are closed at 0 instead of being re-queried forever
+RETELL_SYNC_MAX_AGE_HOURS = float(os.getenv("RETELL_SYNC_MAX_AGE_HOURS", "6"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    day TEXT NOT NULL,
+    channel TEXT,
+    site_id TEXT,
+    kind TEXT NOT NULL,
+    model TEXT,
+    prompt_tokens INTEGER DEFAULT 0,
+    output_tokens INTEGER DEFAULT 0,
+    requests INTEGER DEFAULT 0,
+    minutes REAL,
+    call_id TEXT
+);
+CREATE INDEX IF NOT EXISTS usage_day ON usage(day, channel, kind);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+@contextmanager
+def _connect():
+    global _initialized
+    db = sqlite3.connect(USAGE_DB, timeout=10)
+    db.row_factory = sqlite3.Row
+    try:
+        if not _initialized:
+            with _init_lock:
+                db.executescript(SCHEMA)
+                _initialized = True
+        yield db
+        db.commit()
+    finally:
+        db.close()
+
+# --- Tags ------------------------------------------------------------------
+
+def current_tags():
+    return dict(getattr(_local, "tags", {}))
+
+@contextmanager
+def tag(channel=None, site_id=None):
+    """Tags every usage record made in this thread (nested tags merge)."""
+    previous = current_tags()
+    tags = dict(previous)
+    if channel:
+        tags["channel"] = channel
+    if site_id:
+        tags["site_id"] = site_id
+    _local.tags = tags
+    try:
+        yield tags
+    finally:
+        _local.tags = previous
+
+@contextmanager
+def use_tags(tags):
+    """Re-applies tags captured with current_tags() in another thread (e.g. a worker pool)."""
+    previous = current_tags()
+    _local.tags = dict(tags or {})
+    try:
+        yield
+    finally:
+        _local.tags = previous
+
+# --- Recording -------------------------------------------------------------
+
+def _insert(kind, tags=None, **fields):
+    tags = tags if tags is not None else current_tags()
+    now = datetime.now()
+    fields.update({
+        "ts": now.isoformat(timespec='seconds'), "day": now.strftime('%Y-%m-%d'), "kind": kind,
+        "channel": tags.get("channel"), "site_id": tags.get("site_id")
+    })
+    try:
+        with _connect() as db:
+            db.execute(
+                f"INSERT INTO usage ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})",
+                tuple(fields.values())
+            )
+    except Exception as e:
+        # Accounting must never break generation or a call
+        print(f"Usage Ledger Error: {e}", flush=True)
+
+def record_gemini(model, response, tags=None):
+    """Records the token usage reported by the SDK response (usage_metadata)."""
+    meta = getattr(response, "usage_metadata", None)
+    if meta is None:
+        return
+    output = (getattr(meta, "candidates_token_count", 0) or 0) + (getattr(meta, "thoughts_token_count", 0) or 0)
+    _insert("gemini", tags, model=model, requests=1,
+            prompt_tokens=getattr(meta, "prompt_token_count", 0) or 0, output_tokens=output)
+
+def record_serpapi(engine, tags=None):
+    _insert("serpapi", tags, model=engine, requests=1)
+
+def record_retell_call(call_id, tags=None):
+    """Minutes are unknown when the call starts — sync_retell_minutes() fills them in afterwards."""
+    _insert("retell", tags, requests=1, call_id=call_id)
+
+def sync_retell_minutes():
+    """Fetches the duration of finished Retell calls that have no minutes recorded yet."""
+    api_key = os.getenv("RETELL_API_KEY")
+    if not api_key:
+        return 0
+    import requests
+    cutoff = (datetime.now() - timedelta(hours=RETELL_SYNC_MAX_AGE_HOURS)).isoformat(timespec='seconds')
+    with _connect() as db:
+        closed = db.execute("UPDATE usage SET minutes = 0 WHERE kind = 'retell' AND minutes IS NULL AND ts < ?", (cutoff,)).rowcount
+        rows = db.execute(
+            "SELECT id, call_id FROM usage WHERE kind = 'retell' AND minutes IS NULL AND call_id IS NOT NULL AND ts >= ?", (cutoff,)
+        ).fetchall()
+    if closed:
+        print(f"⚠️ Retell Sync: {closed} calls without a duration after {RETELL_SYNC_MAX_AGE_HOURS:g}h, recorded as 0 min", flush=True)
+    updated = 0
+    for row in rows:
+        try:
+            call = requests.get(
+                f"https://api.retellai.com/v2/get-call/{row['call_id']}",
+                headers={"Authorization": f"Bearer {api_key}"}, timeout=10
+            ).json()
+            start, end = call.get("start_timestamp"), call.get("end_timestamp")
+            if start is not None and end is not None:
+                minutes = (end - start) / 60000
+            elif call.get("call_status") in ("ended", "error"):
+                # Finished without ever connecting — nothing billed, nothing left to wait for
+                minutes = 0
+            else:
+                continue
+            with _connect() as db:
+                db.execute("UPDATE usage SET minutes = ? WHERE id = ?", (minutes, row["id"]))
+            updated += 1
+        except Exception as e:
+            print(f"Retell Sync Error for {row['call_id']}: {e}", flush=True)
+    return updated
+
+# --- Budgets ---------------------------------------------------------------
+
+def _budget(name):
+    try:
+        return float(os.getenv(name, "0") or 0)
+    except ValueError:
+        return 0
+
+def spent_today(channel=None, kind=None):
+    """{'tokens', 'requests', 'minutes'} spent today, optionally for one channel / kind."""
+    where, params = ["day = ?"], [datetime.now().strftime('%Y-%m-%d')]
+    if channel:
+        where.append("channel = ?")
+        params.append(channel)
+    if kind:
+        where.append("kind = ?")
+        params.append(kind)
+    with _connect() as db:
+        row = db.execute(
+            f"SELECT COALESCE(SUM(prompt_tokens + output_tokens), 0) AS tokens, COALESCE(SUM(requests), 0) AS requests, "
+            f"COALESCE(SUM(minutes), 0) AS minutes FROM usage WHERE {' AND '.join(where)}", params
+        ).fetchone()
+    return dict(row)
+
+def over_token_budget(channel):
+    budget = _budget(f"BUDGET_{(channel or '').upper()}_TOKENS")
+    return bool(budget) and spent_today(channel, "gemini")["tokens"] >= budget
+
+def campaign_blocked():
+    """Reason the campaign channel must wait for tomorrow's budget, or None."""
+    if over_token_budget("campaign"):
+        return "buget Gemini"
+    serp_budget = _budget("BUDGET_SERPAPI_REQUESTS")
+    if serp_budget and spent_today(kind="serpapi")["requests"] >= serp_budget:
+        return "buget SerpApi"
+    retell_budget = _budget("BUDGET_RETELL_MINUTES")
+    if retell_budget and spent_today(kind="retell")["minutes"] >= retell_budget:
+        return "buget Retell"
+    return None
+
+# --- Rollups ---------------------------------------------------------------
+
+def rollup(days=7):
+    """Per-day, per-channel, per-kind totals for the admin bot."""
+    since = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    with _connect() as db:
+        rows = db.execute(
+            "SELECT day, COALESCE(channel, '-') AS channel, kind, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(output_tokens) AS output_tokens, SUM(requests) AS requests, COALESCE(SUM(minutes), 0) AS minutes "
+            "FROM usage WHERE day >= ? GROUP BY day, channel, kind ORDER BY day DESC, channel, kind", (since,)
+        ).fetchall()
+    return [dict(r) for r in rows]
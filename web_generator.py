@@ -1,14 +1,195 @@
 import os
 import re
+import json
+import html as html_lib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-
-try:
-    from google import genai
-except ImportError:
-    genai = None
+from gemini import get_client
+from model_router import ModelRouter, GENERATION_CHAIN, EDIT_CHAIN, ROUTER_WORKERS, deadline_in, remaining
+import html_check
+import usage
 
 load_dotenv()
 
+# Identical for every generation: sent once as the system instruction, not inside each prompt
+GENERATION_INSTRUCTIONS = """Creezi landing page-uri HTML complete, single-file, premium, mobile-first pentru afaceri românești.
+
+TECH: Tailwind CDN + AOS 2.3.4 + Google Fonts.
+DESIGN UNIC & CREATIVITATE:
+- Fii EXTREM de variat: Folosește font-uri diferite (ex: Roboto+Oswald, Poppins+Merriweather, Syne+Inter, etc) în funcție de nișă.
+- Paleta de culori: Alege o paletă de culori UNICĂ și perfect adaptată nișei (ex: pasteluri pentru beauty, dark/gold pentru lux, neon/black pentru tech, earth-tones pentru cafea). Nu folosi mereu albastru/dark-mode.
+- Layout Variate: Schimbă structura de bază. Uneori fă un Hero 'split-screen' (text stânga, imagine dreapta), alteori 'centered' cu background full, sau cu un card de contact direct în hero. Diversifică formatele de afișare pentru cards (grid asimetric, masonry, etc).
+
+HEAD obligatoriu:
+<script src="https://cdn.tailwindcss.com"></script>
+<script>window.tailwind=window.tailwind||{};tailwind.config={content:[],theme:{extend:{fontFamily:{sans:['sans-serif'],display:['serif']}}}}</script>
+<link href="https://unpkg.com/aos@2.3.4/dist/aos.css" rel="stylesheet">
+
+Înainte de </body>:
+<script src="https://unpkg.com/aos@2.3.4/dist/aos.js"></script>
+<script>document.addEventListener("DOMContentLoaded",function(){AOS.init({duration:800,once:true})});</script>
+
+SECȚIUNI (obligatorii dar ordinea și designul să fie CREATIVE, nu rigide): Navbar | Hero cu CTA puternic | Trust bar / Asigurări | Despre/De Ce Noi | Servicii | Testimoniale reale | Footer cu "Site creat de WEB? DONE! © 2026"
+
+IMAGINI — OBLIGATORIU (minim 4-5 poze reale pe pagină), STRICT de pe loremflickr.com cu CUVINTE CHEIE ÎN ENGLEZĂ extrase din nișă și un lock random (1-100) pentru consistență. Exemple (adaptate la nișă!):
+- Hero background: style="background-image: url('https://loremflickr.com/1920/1080/mechanic,car/all?lock=1'); background-size: cover; background-position: center;"
+- Secțiunea Despre: <img src="https://loremflickr.com/800/600/engine,repair/all?lock=2" class="w-full h-64 object-cover rounded-xl" alt="Echipa">
+- Imagini servicii: <img src="https://loremflickr.com/800/600/auto,service/all?lock=3" class="w-full h-48 object-cover rounded-xl" alt="Serviciu 1">
+
+REGULI: Texte 100% în română, naturale, fără placeholder. Mobile-first cu clase Tailwind responsive. Buton tel: cu telefonul afacerii. Dacă primești un logo, pune-l în navbar și hero. AOS pe elemente. Returnează DOAR HTML valid începând cu <!DOCTYPE html>. Fără markdown, fără explicații."""
+
+EDIT_INSTRUCTIONS = """Ești un Expert Web Developer. Primești un fragment HTML (footer-ul sau secțiunea de contact a unui site) și date noi de la client.
+REGULI:
+1. Inserează/actualizează link-urile de Social Media sau Info folosind iconițe sociale (SVG simple).
+2. NU MODIFICA design-ul, culorile, clasele existente sau structura; menține optimizarea MOBILE.
+3. Dacă link-urile există deja, actualizează-le cu noile valori.
+4. Returnează DOAR fragmentul actualizat, începând cu același tag de deschidere. Fără markdown, fără explicații."""
+
+# How much of a broken page is sent back to the model when repairing it
+CONTINUATION_TAIL = 4000
+SECTION_CONTEXT = 3000
+TOP_SECTIONS = ("Navbar", "Hero")
+
+# Edits without a recognizable footer/contact section fall back to sending (a prefix of) the whole page
+FULL_PAGE_EDIT_CHARS = 30000
+
+# page: one completion for the whole page | sections: design spec, then every section in parallel
+GEN_MODE = os.getenv("GEN_MODE", "page")
+# Seconds kept in reserve so a failed section can still be retried on its own
+SECTION_RETRY_RESERVE = 20
+
+# (name, what the section must contain) in page order
+SECTION_PLAN = [
+    ("Navbar", "Navbar fix/sticky cu numele afacerii (sau logo-ul), link-uri ancoră către secțiuni și buton tel:. Meniu mobil simplu."),
+    ("Hero", "Hero cu titlu <h1> puternic, subtitlu, CTA tel: și imagine de fundal sau laterală, după layout-ul din specificație."),
+    ("Trust bar", "Trust bar / Asigurări: 3-4 puncte scurte (ani de experiență, garanție, rating Google etc.) cu iconițe SVG."),
+    ("Despre", "Despre / De Ce Noi cu o imagine și 3 argumente concrete pentru nișă."),
+    ("Servicii", "Servicii: 3-6 carduri cu titlu, descriere scurtă și imagine (id=\"servicii\")."),
+    ("Testimoniale", "Testimoniale: folosește recenziile reale primite sau creează 3 plauzibile (id=\"testimoniale\")."),
+    ("Footer", "Footer cu adresa, telefon (tel:), program și textul \"Site creat de WEB? DONE! © 2026\". Folosește tag-ul <footer>."),
+]
+
+DESIGN_SPEC_INSTRUCTIONS = """Ești art director pentru landing page-uri de afaceri românești. Alege un design UNIC, adaptat nișei (nu mereu albastru/dark-mode).
+Returnează DOAR un JSON: {"fonts": {"display": "<Google Font>", "body": "<Google Font>"}, "palette": {"primary": "#hex", "secondary": "#hex", "accent": "#hex", "background": "#hex", "text": "#hex"}, "hero_layout": "split|centered|card", "cards_layout": "grid|asymmetric|masonry", "tone": "tu|dumneavoastră", "image_keywords": "<2-3 cuvinte în engleză, separate prin virgulă>"}"""
+
+SECTION_INSTRUCTIONS = """Scrii O SINGURĂ secțiune dintr-un landing page premium, mobile-first, pentru o afacere românească. Restul paginii e scris în paralel, în același stil.
+REGULI:
+- Returnează DOAR elementul secțiunii (<nav>, <section> sau <footer>), fără <html>, <head>, <body>, <script> sau <style>, fără markdown.
+- Tailwind cu clasele din tema paginii: bg-primary, text-primary, bg-secondary, bg-accent, bg-page, text-ink, font-display, font-sans; responsive (sm:, md:, lg:).
+- data-aos pe elementele principale (fade-up, fade-right etc).
+- Imagini STRICT de pe loremflickr.com cu cuvintele cheie din specificație: https://loremflickr.com/800/600/<cuvinte>/all?lock=<număr unic 1-100>.
+- Texte 100% în română, naturale, fără placeholder, pe tonul din specificație."""
+
+DEFAULT_SPEC = {
+    "fonts": {"display": "Poppins", "body": "Inter"},
+    "palette": {"primary": "#0f766e", "secondary": "#134e4a", "accent": "#f59e0b", "background": "#ffffff", "text": "#1f2937"},
+    "hero_layout": "split", "cards_layout": "grid", "tone": "dumneavoastră", "image_keywords": "business,office"
+}
+
+# Section threads only wait on router calls. Sized with the router pool so every running section
+# gets its primary call and a hedge at once — a section never queues behind another one's calls
+_section_pool = ThreadPoolExecutor(max_workers=max(len(SECTION_PLAN), ROUTER_WORKERS // 2))
+
+def build_generation_prompt(biz_data):
+    """The per-business part of a generation request — everything static lives in GENERATION_INSTRUCTIONS."""
+    reviews = biz_data.get("reviews", [])
+    if reviews:
+        reviews_block = f"RECENZII REALE GOOGLE ({biz_data.get('rating', 0)}⭐ din {biz_data.get('reviews_count', 0)} recenzii):\n"
+        for r in reviews:
+            stars = "⭐" * int(r.get("rating", 5))
+            reviews_block += f'- {stars} "{r["text"]}" — {r["author"]}\n'
+    else:
+        reviews_block = "Nu există recenzii disponibile, creează 3 testimoniale plauzibile.\n"
+
+    extra_info = biz_data.get("extra_info", "")
+    extra_block = f"DETALII IMPORTANTE DE LA CLIENT (Folosește-le în text!):\n{extra_info}\n" if extra_info else ""
+
+    logo_base64 = biz_data.get("logo_base64")
+    logo_block = f"LOGO CLIENT (Include-l în Navbar și Hero): <img src='{logo_base64}' alt='Logo {biz_data['name']}' style='max-height:80px;'>\n" if logo_base64 else ""
+
+    return (
+        f"Afacere: {biz_data['name']} | Nișă: {biz_data['category']} | Loc: {biz_data['address']} | Tel: {biz_data['phone']}\n"
+        f"{logo_block}{reviews_block}{extra_block}"
+    )
+
+def _parse_spec(text):
+    """The design spec JSON merged over DEFAULT_SPEC, or None if the answer is not usable."""
+    try:
+        spec = json.loads(re.sub(r'^```(?:json)?\s*|```\s*$', '', text.strip()))
+    except ValueError:
+        return None
+    if not isinstance(spec, dict):
+        return None
+    merged = json.loads(json.dumps(DEFAULT_SPEC))
+    for key, value in spec.items():
+        if isinstance(merged.get(key), dict) and isinstance(value, dict):
+            merged[key].update({k: v for k, v in value.items() if isinstance(v, str)})
+        elif key in merged and isinstance(value, str):
+            merged[key] = value
+    # Everything below ends up inside HTML attributes and a script — keep it to safe characters
+    for name, color in list(merged["palette"].items()):
+        if not re.fullmatch(r'#[0-9a-fA-F]{3,8}', color):
+            merged["palette"][name] = DEFAULT_SPEC["palette"].get(name, "#000000")
+    for role, font in list(merged["fonts"].items()):
+        if not re.fullmatch(r'[A-Za-z0-9 ]{2,40}', font):
+            merged["fonts"][role] = DEFAULT_SPEC["fonts"].get(role, "Inter")
+    merged["image_keywords"] = re.sub(r'[^a-z0-9,]', '', merged["image_keywords"].lower()) or DEFAULT_SPEC["image_keywords"]
+    return merged
+
+def stitch_page(biz_data, spec, sections):
+    """One document from the generated sections, with the HEAD/AOS boilerplate the single-page prompt asks for."""
+    fonts, palette = spec["fonts"], spec["palette"]
+    families = "&".join(f"family={f.replace(' ', '+')}:wght@400;600;700;800" for f in dict.fromkeys(fonts.values()))
+    config = {
+        "content": [],
+        "theme": {"extend": {
+            "fontFamily": {"sans": [fonts["body"], "sans-serif"], "display": [fonts["display"], "serif"]},
+            "colors": {
+                "primary": palette["primary"], "secondary": palette["secondary"], "accent": palette["accent"],
+                "page": palette["background"], "ink": palette["text"]
+            }
+        }}
+    }
+    name = html_lib.escape(biz_data['name'])
+    body = "\n".join(sections)
+    return f"""<!DOCTYPE html>
+<html lang="ro">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{name} | {html_lib.escape(biz_data.get('category') or '')}</title>
+<link rel="preconnect" href="https://fonts.googleapis.com">
+<link href="https://fonts.googleapis.com/css2?{families}&display=swap" rel="stylesheet">
+<script src="https://cdn.tailwindcss.com"></script>
+<script>window.tailwind=window.tailwind||{{}};tailwind.config={json.dumps(config)}</script>
+<link href="https://unpkg.com/aos@2.3.4/dist/aos.css" rel="stylesheet">
+</head>
+<body class="font-sans bg-page text-ink antialiased">
+{body}
+<script src="https://unpkg.com/aos@2.3.4/dist/aos.js"></script>
+<script>document.addEventListener("DOMContentLoaded",function(){{AOS.init({{duration:800,once:true}})}});</script>
+</body>
+</html>"""
+
+def contact_fragment(html):
+    """(start, end) of the part of the page that holds links and contact info: the last <footer>, else a contact section."""
+    footers = list(re.finditer(r'<footer\b.*?</footer>', html, re.IGNORECASE | re.DOTALL))
+    if footers:
+        return footers[-1].span()
+    contact = re.search(r'<section\b[^>]*\bid="contact[^"]*"[^>]*>.*?</section>', html, re.IGNORECASE | re.DOTALL)
+    return contact.span() if contact else None
+
+def build_edit_prompt(fragment, extra_info):
+    return f"DATE NOI: {extra_info}\n\nFRAGMENT:\n{fragment}"
+
+def _strip_fences(text):
+    return re.sub(r'^```(?:html)?\s*|```\s*$', '', text.strip()).strip()
+
+def _insert_before_footer(html, fragment):
+    footer = html.lower().rfind("<footer")
+    at = footer if footer != -1 else html.lower().rfind("</body>")
+    return html[:at] + fragment + "\n" + html[at:] if at != -1 else html + fragment
+
 class WebGenerator:
     """
     Generates personalized demo landing pages for Romanian businesses.
@@ -19,89 +200,210 @@ class WebGenerator:
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        # Configure Gemini via New SDK
-        api_key = os.getenv("GEMINI_API_KEY")
-        if api_key and genai:
-            self.client = genai.Client(api_key=api_key)
-        else:
-            self.client = None
+        # Shared Gemini client (SDK is imported on first use)
+        self.client = get_client()
+        self.router = ModelRouter(self.client) if self.client else None
 
-    def _generate_ai_html(self, biz_data):
+    @staticmethod
+    def _clean_html(text):
+        """Strips markdown fences; returns None if the answer is not an HTML document."""
+        html_content = text.strip()
+        html_content = re.sub(r'^```(?:html)?\s*', '', html_content, flags=re.MULTILINE)
+        html_content = re.sub(r'```\s*$', '', html_content, flags=re.MULTILINE)
+        html_content = html_content.strip()
+        if "<!DOCTYPE html>" not in html_content and "<html>" not in html_content:
+            return None
+        return html_content
+
+    def _generate_ai_html(self, biz_data, deadline=None):
         """Uses Gemini and enriches the prompt with real reviews and business context."""
         if not self.client:
             return f"<!DOCTYPE html><html><body><h1>Cheia API Gemini lipsește</h1></body></html>"
 
-        # ... (reviews and street view blocks same as before) ...
-        reviews = biz_data.get("reviews", [])
-        rating = biz_data.get("rating", 0)
-        reviews_count = biz_data.get("reviews_count", 0)
-        street_view_url = biz_data.get("street_view_url", None)
-
-        reviews_block = ""
-        if reviews:
-            reviews_block = f"\nRECENZII REALE GOOGLE ({rating}⭐ din {reviews_count} recenzii):\n"
-            for r in reviews:
-                stars = "⭐" * int(r.get("rating", 5))
-                reviews_block += f'- {stars} "{r["text"]}" — {r["author"]}\n'
-        else:
-            reviews_block = "\nNu există recenzii disponibile, creează 3 testimoniale plauzibile.\n"
+        deadline = deadline or deadline_in()
+        if GEN_MODE == "sections":
+            return self._generate_by_sections(biz_data, deadline)
 
-        extra_info = biz_data.get("extra_info", "")
-        extra_block = f"\nDETALII IMPORTANTE DE LA CLIENT (Folosește-le în text!):\n{extra_info}\n" if extra_info else ""
-        
-        logo_base64 = biz_data.get("logo_base64")
-        logo_block = f"\nLOGO CLIENT (Include-l în Navbar și Hero): <img src='{logo_base64}' alt='Logo {biz_data['name']}' style='max-height:80px;'>\n" if logo_base64 else ""
+        prompt = build_generation_prompt(biz_data)
+        try:
+            # Falls back / hedges across GEN_MODELS and never runs past the deadline
+            html_content = self.router.generate(
+                prompt, GENERATION_CHAIN, deadline=deadline, validate=self._counted_clean_html,
+                config={"system_instruction": GENERATION_INSTRUCTIONS}
+            )
+            html_content = self._repair(html_content, biz_data, deadline)
+            return self._surgical_fixes(html_content, biz_data)
+        except Exception as e:
+            print(f"CRITICAL ERROR (Mobile Fix): {e}")
+            return f"<!DOCTYPE html><html><body style='padding:40px; font-family:sans-serif; text-align:center;'><h1>{biz_data['name']}</h1><p>Contact: {biz_data['phone']}</p><p style='color:red;'>AI Generation Failed. Please try again.</p></body></html>"
 
-        prompt = f"""Creează un landing page HTML complet, single-file, premium, mobile-first pentru:
-Afacere: {biz_data['name']} | Nișă: {biz_data['category']} | Loc: {biz_data['address']} | Tel: {biz_data['phone']}
-{logo_block}{reviews_block}{extra_block}
+    def _generate_by_sections(self, biz_data, deadline):
+        """Design spec first, then every section as its own concurrent call, stitched locally."""
+        prompt = build_generation_prompt(biz_data)
+        try:
+            spec = self.router.generate(
+                prompt, GENERATION_CHAIN, deadline=deadline, validate=_parse_spec,
+                config={"system_instruction": DESIGN_SPEC_INSTRUCTIONS, "response_mime_type": "application/json"}
+            )
+        except Exception as e:
+            print(f"⚠️ [SECTIONS] Design spec failed, using the default one: {e}", flush=True)
+            spec = _parse_spec(json.dumps(DEFAULT_SPEC))
 
-TECH: Tailwind CDN + AOS 2.3.4 + Google Fonts.
-DESIGN UNIC & CREATIVITATE:
-- Fii EXTREM de variat: Folosește font-uri diferite (ex: Roboto+Oswald, Poppins+Merriweather, Syne+Inter, etc) în funcție de nișă.
-- Paleta de culori: Alege o paletă de culori UNICĂ și perfect adaptată nișei (ex: pasteluri pentru beauty, dark/gold pentru lux, neon/black pentru tech, earth-tones pentru cafea). Nu folosi mereu albastru/dark-mode.
-- Layout Variate: Schimbă structura de bază. Uneori fă un Hero 'split-screen' (text stânga, imagine dreapta), alteori 'centered' cu background full, sau cu un card de contact direct în hero. Diversifică formatele de afișare pentru cards (grid asimetric, masonry, etc).
+        spec_block = json.dumps(spec, ensure_ascii=False)
+        tags = usage.current_tags()
 
-HEAD obligatoriu:
-<script src="https://cdn.tailwindcss.com"></script>
-<script>window.tailwind=window.tailwind||{{}};tailwind.config={{content:[],theme:{{extend:{{fontFamily:{{sans:['sans-serif'],display:['serif']}}}}}}}}</script>
-<link href="https://unpkg.com/aos@2.3.4/dist/aos.css" rel="stylesheet">
+        def generate_section(name, brief, retry=False):
+            # Budget taken when the section starts, not when it was queued; the first
+            # round leaves time for a retry of whatever fails
+            until = deadline if retry else deadline - min(SECTION_RETRY_RESERVE, remaining(deadline) / 2)
+            with usage.use_tags(tags):
+                return self.router.generate(
+                    f"{prompt}\nSPECIFICAȚIE DESIGN: {spec_block}\nSECȚIUNEA: {name} — {brief}",
+                    GENERATION_CHAIN, deadline=until, validate=self._clean_section,
+                    config={"system_instruction": SECTION_INSTRUCTIONS}
+                )
 
-Înainte de </body>:
-<script src="https://unpkg.com/aos@2.3.4/dist/aos.js"></script>
-<script>document.addEventListener("DOMContentLoaded",function(){{AOS.init({{duration:800,once:true}})}});</script>
+        futures = [_section_pool.submit(generate_section, name, brief) for name, brief in SECTION_PLAN]
+        sections = {}
+        for (name, brief), future in zip(SECTION_PLAN, futures):
+            try:
+                sections[name] = future.result()
+            except Exception as e:
+                print(f"⚠️ [SECTIONS] {name} failed ({e}), retrying it alone", flush=True)
+                sections[name] = _section_pool.submit(generate_section, name, brief, retry=True)
 
-SECȚIUNI (obligatorii dar ordinea și designul să fie CREATIVE, nu rigide): Navbar | Hero cu CTA puternic | Trust bar / Asigurări | Despre/De Ce Noi | Servicii | Testimoniale reale | Footer cu "Site creat de WEB? DONE! © 2026"
+        for name, value in list(sections.items()):
+            if not isinstance(value, str):
+                try:
+                    sections[name] = value.result()
+                except Exception as e:
+                    # Left out here — _repair generates a missing required section on its own
+                    print(f"⚠️ [SECTIONS] {name} failed again: {e}", flush=True)
+                    del sections[name]
 
-IMAGINI — OBLIGATORIU (minim 4 poze reale pe pagină):
-Pentru imagini, folosește STRICT formatul loremflickr.com adăugând CUVINTE CHEIE RELEVANTE ÎN ENGLEZĂ extrase din nișă ({biz_data['category']}) și un lock random (1-100) pentru consistență:
-Exemple concrete (adaptate la nișă!):
-- Hero background: style="background-image: url('https://loremflickr.com/1920/1080/mechanic,car/all?lock=1'); background-size: cover; background-position: center;"
-- Secțiunea Despre: <img src="https://loremflickr.com/800/600/engine,repair/all?lock=2" class="w-full h-64 object-cover rounded-xl" alt="Echipa">
-- Imagini servicii: <img src="https://loremflickr.com/800/600/auto,service/all?lock=3" class="w-full h-48 object-cover rounded-xl" alt="Serviciu 1">
-PUNE MINIM 4-5 imagini pe pagină! AȘA CUM SUNT EXEMPLELE DE MAI SUS. FĂRĂ placeholder urât, folosește DOAR loremflickr.com cu tag-uri STRICT ÎN ENGLEZĂ (ex: dentist,smile / pizza,food / car,mechanic etc).
+        if not sections:
+            print("CRITICAL ERROR (Sections): no section could be generated")
+            return f"<!DOCTYPE html><html><body style='padding:40px; font-family:sans-serif; text-align:center;'><h1>{biz_data['name']}</h1><p>Contact: {biz_data['phone']}</p><p style='color:red;'>AI Generation Failed. Please try again.</p></body></html>"
+
+        html_content = stitch_page(biz_data, spec, [sections[name] for name, _ in SECTION_PLAN if name in sections])
+        html_content = self._repair(html_content, biz_data, deadline)
+        return self._surgical_fixes(html_content, biz_data)
+
+    @staticmethod
+    def _clean_section(text):
+        text = _strip_fences(text)
+        if not text.startswith("<") or re.search(r'<(html|head|body)\b', text, re.IGNORECASE):
+            return None
+        return text
+
+    def _counted_clean_html(self, text):
+        html = self._clean_html(text)
+        if html is None:
+            # Not a page at all: the router has to regenerate it from scratch
+            html_check.record("full_retry")
+        return html
+
+    def _repair(self, html, biz_data, deadline):
+        """Fixes what html_check finds with the smallest possible model calls (or none at all)."""
+        phone = biz_data.get('phone') if re.search(r'\d', biz_data.get('phone') or '') else None
+        problems = html_check.check(html, phone)
+        if not problems:
+            html_check.record("valid")
+            return html
+
+        print(f"🩹 [REPAIR] {biz_data['name']}: {', '.join(problems)}", flush=True)
+        if "truncated" in problems:
+            html = self._continue_truncated(html, deadline)
+        missing = [p.split(':', 1)[1] for p in html_check.check(html) if p.startswith("missing:")]
+        for group in ([m for m in missing if m in TOP_SECTIONS], [m for m in missing if m not in TOP_SECTIONS]):
+            if group:
+                html = self._add_sections(html, biz_data, group, deadline)
+        if phone and "no_tel_cta" in html_check.check(html, phone):
+            html = self._add_call_button(html, phone)
+        if html_check.image_count(html) < html_check.MIN_IMAGES:
+            html = self._add_gallery(html)
+
+        left = html_check.check(html, phone)
+        html_check.record("unrepaired" if left else "repaired", problems)
+        if left:
+            print(f"⚠️ [REPAIR] {biz_data['name']} still has: {', '.join(left)}", flush=True)
+        return html
+
+    def _continue_truncated(self, html, deadline):
+        """Asks for the rest of a cut-off page only, not the whole page again."""
+        prompt = (
+            f"Documentul HTML de mai jos a fost tăiat înainte de final. Ultima parte:\n{html[-CONTINUATION_TAIL:]}\n\n"
+            "Scrie DOAR continuarea exactă, fără să repeți nimic din ce există deja, și închide toate tag-urile "
+            "rămase deschise, până la </html> inclusiv. Fără markdown, fără explicații."
+        )
+
+        def validate(text):
+            text = _strip_fences(text)
+            return text if "</html>" in text.lower() else None
 
-REGULI: Texte 100% în română, naturale, fără placeholder. Mobile-first cu clase Tailwind responsive. Buton tel:{biz_data['phone']}.{' Logo furnizat: pune-l în navbar și hero.' if biz_data.get('logo_base64') else ''} AOS pe elemente. Returnează DOAR HTML valid începând cu <!DOCTYPE html>. Fără markdown, fără explicații."""
-                
         try:
-            response = self.client.models.generate_content(
-                model='gemini-2.5-flash',
-                contents=prompt
+            continuation = self.router.generate(
+                prompt, GENERATION_CHAIN, deadline=deadline, validate=validate,
+                config={"system_instruction": GENERATION_INSTRUCTIONS}
             )
-            html_content = response.text.strip()
-            
-            # Robust cleaning of markdown delimiters
-            html_content = re.sub(r'^```(?:html)?\s*', '', html_content, flags=re.MULTILINE)
-            html_content = re.sub(r'```\s*$', '', html_content, flags=re.MULTILINE)
-            html_content = html_content.strip()
+        except Exception as e:
+            print(f"CONTINUATION ERROR: {e}")
+            return html
+        # Models often restart a few characters back — drop the overlap
+        for k in range(min(len(continuation), 500), 0, -1):
+            if html.endswith(continuation[:k]):
+                continuation = continuation[k:]
+                break
+        return html + continuation
 
-            if "<!DOCTYPE html>" not in html_content and "<html>" not in html_content:
-                 raise ValueError("AI response did not provide valid HTML")
-            
-            return self._surgical_fixes(html_content, biz_data)
+    def _add_sections(self, html, biz_data, names, deadline):
+        """Generates only the missing sections, in the page's own style, and splices them in."""
+        prompt = (
+            f"{build_generation_prompt(biz_data)}\n"
+            f"Pagina generată nu are secțiunile: {', '.join(names)}. Începutul paginii (stil, culori, fonturi):\n"
+            f"{html[:SECTION_CONTEXT]}\n\n"
+            "Returnează DOAR HTML-ul secțiunilor lipsă, în această ordine și în același stil. "
+            "Fără <html>, <head> sau <body>, fără markdown, fără explicații."
+        )
+
+        try:
+            fragment = self.router.generate(
+                prompt, GENERATION_CHAIN, deadline=deadline, validate=self._clean_section,
+                config={"system_instruction": GENERATION_INSTRUCTIONS}
+            )
         except Exception as e:
-            print(f"CRITICAL ERROR (Mobile Fix): {e}")
-            return f"<!DOCTYPE html><html><body style='padding:40px; font-family:sans-serif; text-align:center;'><h1>{biz_data['name']}</h1><p>Contact: {biz_data['phone']}</p><p style='color:red;'>AI Generation Failed. Please try again.</p></body></html>"
+            print(f"SECTION REPAIR ERROR: {e}")
+            return html
+        if names[0] in TOP_SECTIONS:
+            body = re.search(r'<body[^>]*>', html, re.IGNORECASE)
+            if body:
+                return html[:body.end()] + "\n" + fragment + html[body.end():]
+        return _insert_before_footer(html, fragment)
+
+    @staticmethod
+    def _add_call_button(html, phone):
+        number = re.sub(r'[^\d+]', '', phone)
+        button = (
+            f'<a href="tel:{number}" class="fixed bottom-6 right-6 z-50 rounded-full bg-green-600 px-5 py-3 '
+            f'font-bold text-white shadow-lg">📞 Sună acum</a>'
+        )
+        body_end = html.lower().rfind("</body>")
+        return html[:body_end] + button + html[body_end:] if body_end != -1 else html + button
+
+    @staticmethod
+    def _add_gallery(html):
+        """Tops the page up to MIN_IMAGES with a gallery strip reusing the page's own image keywords."""
+        keywords = re.search(r'loremflickr\.com/\d+/\d+/([A-Za-z0-9,_\-]+)', html)
+        keywords = keywords.group(1) if keywords else "business,office"
+        missing = html_check.MIN_IMAGES - html_check.image_count(html)
+        images = "".join(
+            f'<img src="https://loremflickr.com/800/600/{keywords}/all?lock={60 + i}" '
+            f'class="w-full h-48 object-cover rounded-xl" alt="Galerie {i + 1}" loading="lazy">'
+            for i in range(missing)
+        )
+        return _insert_before_footer(
+            html, f'<section class="py-12 px-6"><div class="max-w-6xl mx-auto grid grid-cols-2 md:grid-cols-4 gap-4">{images}</div></section>'
+        )
 
     def _surgical_fixes(self, html, biz_data):
         """Inyects bulletproof fixes for images and branding."""
@@ -132,11 +434,42 @@ REGULI: Texte 100% în română, naturale, fără placeholder. Mobile-first cu c
             
         return html
 
-    def enrich_html_with_links(self, html_content, extra_info):
-        """Surgically injects or updates links in existing HTML using a focused AI call."""
+    def enrich_html_with_links(self, html_content, extra_info, deadline=None):
+        """
+        Surgically injects or updates links in existing HTML using a focused AI call.
+        Only the footer (else the contact section) is sent and replaced: edits carry social
+        links and contact info, which the full-page prompt already placed there.
+        """
         if not self.client or not extra_info:
             return html_content
 
+        span = contact_fragment(html_content)
+        if span is None:
+            return self._enrich_full_page(html_content, extra_info, deadline)
+
+        start, end = span
+        fragment = html_content[start:end]
+        opening_tag = re.match(r'<(\w+)', fragment).group(1).lower()
+
+        def validate(text):
+            text = _strip_fences(text)
+            # The answer must be the same element, whole — anything else would corrupt the page
+            if not re.match(rf'<{opening_tag}\b', text, re.IGNORECASE) or not text.lower().endswith(f"</{opening_tag}>"):
+                return None
+            return text
+
+        try:
+            updated = self.router.generate(
+                build_edit_prompt(fragment, extra_info), EDIT_CHAIN, deadline=deadline, validate=validate,
+                config={"system_instruction": EDIT_INSTRUCTIONS}
+            )
+            return html_content[:start] + updated + html_content[end:]
+        except Exception as e:
+            print(f"ENRICH ERROR: {e}")
+            return html_content
+
+    def _enrich_full_page(self, html_content, extra_info, deadline=None):
+        """Old-style edit for pages without a footer/contact section: the model rewrites the whole page."""
         prompt = f"""
         Ești un Expert Web Developer. Modifică acest cod HTML pentru a insera/actualiza următoarele link-uri de Social Media sau Info:
         DATE NOI: {extra_info}
@@ -150,23 +483,12 @@ REGULI: Texte 100% în română, naturale, fără placeholder. Mobile-first cu c
         6. Fără ```html, începe direct cu <!DOCTYPE html>.
 
         COD SURSĂ:
-        {html_content[:30000]}
+        {html_content[:FULL_PAGE_EDIT_CHARS]}
         """
         
         try:
-            response = self.client.models.generate_content(
-                model='gemini-3.1-pro-preview',
-                contents=prompt
-            )
-            enriched_html = response.text.strip()
-            # Clean here too
-            enriched_html = re.sub(r'^```(?:html)?\s*', '', enriched_html, flags=re.MULTILINE)
-            enriched_html = re.sub(r'```\s*$', '', enriched_html, flags=re.MULTILINE)
-            enriched_html = enriched_html.strip()
-
-            if "<!DOCTYPE html>" in enriched_html:
-                return self._surgical_fixes(enriched_html, {"name": "Enriched Site"})
-            return self._surgical_fixes(html_content, {"name": "Enriched Site"})
+            enriched_html = self.router.generate(prompt, EDIT_CHAIN, deadline=deadline, validate=self._clean_html)
+            return self._surgical_fixes(enriched_html, {"name": "Enriched Site"})
         except Exception as e:
             print(f"ENRICH ERROR: {e}")
             return html_content
@@ -174,8 +496,7 @@ REGULI: Texte 100% în română, naturale, fără placeholder. Mobile-first cu c
     def generate_site(self, biz_data):
         """Generates a complete unique website using AI and returns (site_id, file_path)."""
         import uuid
-        import json
-        from datetime import datetime
+        import site_store
 
         print(f"🤖 AI-ul lucrează intens la un design UNIC pentru {biz_data['name']}...")
         html_raw = self._generate_ai_html(biz_data)
@@ -186,27 +507,10 @@ REGULI: Texte 100% în română, naturale, fără placeholder. Mobile-first cu c
         # Generate ID matching server style
         site_id = str(uuid.uuid4())[:8].upper()
         
-        # Unified storage in 'demos' directory (Absolute path)
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        sites_dir = os.path.join(base_dir, 'demos')
-        os.makedirs(sites_dir, exist_ok=True)
-        
-        file_path = os.path.join(sites_dir, f"{site_id}.html")
-        meta_path = os.path.join(sites_dir, f"{site_id}.json")
-
-        meta = {
-            "id": site_id,
-            "biz_name": biz_data["name"],
-            "created": datetime.now().isoformat()
-        }
-        
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
-        
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(meta, f, ensure_ascii=False)
+        # Same sharded layout as the server
+        site_store.save_site(site_id, html_content, {"biz_name": biz_data["name"], "category": biz_data.get("category")})
         
-        return site_id, os.path.abspath(file_path)
+        return site_id, site_store.html_path(site_id)
 
 if __name__ == "__main__":
     gen = WebGenerator()